@@ -0,0 +1,109 @@
+import argparse
+import sys
+from game import FIX_MAX, ENG_MAX, HACK_ROLL, HACK_CRIT, CPU_ROLL, CPU_ZAP, CPU_ENCRYPT, ENC_BASE, ENC_STEP, FINAL_ENC, encryption
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+## MARK: Constants ##
+STRATEGIES = {'hack': 1.0, 'guard': 0.0, 'mixed': 0.5}
+CHUNK = 1 << 20
+
+## MARK: Rollouts ##
+def rollout(rng, n, enc_max, eng, hack_p, max_turns):
+	won = np.zeros(n, dtype=bool)
+	eng = np.broadcast_to(np.asarray(eng, dtype=np.int16), n)
+	left = eng.copy()
+	turns = np.full(n, max_turns, dtype=np.int32)
+	ids = np.arange(n)
+	enc = np.full(n, enc_max, dtype=np.int16)
+	energy = eng.copy()
+	for turn in range(max_turns):
+		m = len(ids)
+		if not m:
+			break
+		hack = rng.random(m) < hack_p
+		crit = rng.integers(0, HACK_ROLL + 1, m) >= HACK_CRIT
+		enc -= hack * (1 + crit)
+		action = rng.integers(0, CPU_ROLL + 1, m)
+		live = enc > 0
+		energy -= live & hack & (action >= CPU_ZAP) & (action < CPU_ENCRYPT)
+		enc += live & (action >= CPU_ENCRYPT) & (enc < enc_max)
+		done = (enc <= 0) | (energy <= 0)
+		if done.any():
+			finished = ids[done]
+			won[finished] = enc[done] <= 0
+			left[finished] = energy[done]
+			turns[finished] = turn + 1
+			keep = ~done
+			ids, enc, energy = ids[keep], enc[keep], energy[keep]
+	stalled = np.zeros(n, dtype=bool)
+	stalled[ids] = True
+	left[ids] = energy
+	return won, stalled, eng - left, turns
+
+def simulate(battles, seed, eng_max, fix_max, curve, hack_p, max_turns, fresh=False):
+	rng = np.random.default_rng(seed)
+	results = []
+	for strategy, p in hack_p.items():
+		energy = np.full(battles, eng_max, dtype=np.int16)
+		for battle in range(fix_max + 1):
+			enc_max = encryption(battle, fix_max, *curve)
+			if fresh:
+				energy = np.full(battles, eng_max + battle, dtype=np.int16)
+			if not len(energy):
+				break
+			won, stalled, lost, turns = [], [], [], []
+			for start in range(0, len(energy), CHUNK):
+				w, s, l, t = rollout(rng, len(energy[start:start + CHUNK]), enc_max, energy[start:start + CHUNK], p, max_turns)
+				won.append(w)
+				stalled.append(s)
+				lost.append(l)
+				turns.append(t)
+			won, stalled, lost, turns = [np.concatenate(a) for a in [won, stalled, lost, turns]]
+			results.append((battle, strategy, enc_max, energy, won, stalled, lost, turns))
+			energy = (energy - lost + 1)[won]
+	results.sort(key=lambda result: result[0])
+	return results
+
+## MARK: Report ##
+def report(results, battles, fresh=False):
+	if fresh:
+		print('Every battle starts at full energy (eng_max + battle), so later win rates are optimistic.')
+	else:
+		print('Energy carries over: each battle starts with what the last one left plus the 1 point a win gives.')
+		print('Energy spent or regained between battles (hull breaches, packs, pods) is not modelled.')
+	print()
+	print('{0:>6} {1:>8} {2:>4} {3:>5} {4:>7} {5:>7} {6:>7} {7:>9} {8:>4} {9:>4} {10:>4} {11:>7}'.format('battle', 'strategy', 'enc', 'eng', 'reach%', 'win%', 'stall%', 'loss avg', 'p50', 'p90', 'max', 'turns'))
+	for battle, strategy, enc_max, eng, won, stalled, lost, turns in results:
+		p50, p90 = np.percentile(lost, [50, 90])
+		print('{0:>6} {1:>8} {2:>4} {3:>5.1f} {4:>7.2f} {5:>7.2f} {6:>7.2f} {7:>9.2f} {8:>4.0f} {9:>4.0f} {10:>4} {11:>7.1f}'.format(battle + 1, strategy, enc_max, eng.mean(), 100 * len(won) / battles, 100 * won.mean(), 100 * stalled.mean(), lost.mean(), p50, p90, lost.max(), turns.mean()))
+	print()
+	for battle, strategy, enc_max, eng, won, stalled, lost, turns in results:
+		counts = np.bincount(lost, minlength=eng.max() + 1)
+		print('{0} {1:>8} energy lost: {2}'.format(battle + 1, strategy, ' '.join('{0}:{1:.1f}%'.format(i, 100 * c / len(lost)) for i, c in enumerate(counts) if c)))
+
+## MARK: Main ##
+def main():
+	parser = argparse.ArgumentParser(description='Monte Carlo balance simulator for the CPU hacking battles')
+	parser.add_argument('-n', '--battles', type=int, default=1000000, help='battles per battle index and strategy')
+	parser.add_argument('--seed', type=int, default=None)
+	parser.add_argument('--eng-max', type=int, default=ENG_MAX, help='energy before the first battle')
+	parser.add_argument('--fix-max', type=int, default=FIX_MAX, help='number of fix events before the final battle')
+	parser.add_argument('--enc-base', type=int, default=ENC_BASE, help='encryption of the first battle')
+	parser.add_argument('--enc-step', type=int, default=ENC_STEP, help='encryption added per battle')
+	parser.add_argument('--final-enc', type=int, default=FINAL_ENC, help='encryption of the final battle')
+	parser.add_argument('--mix', type=float, default=STRATEGIES['mixed'], help='chance to hack each turn for the mixed strategy')
+	parser.add_argument('--max-turns', type=int, default=200, help='turns before a battle counts as stalled')
+	parser.add_argument('--fresh', action='store_true', help='start every battle at full energy instead of carrying energy over')
+	args = parser.parse_args()
+	if np is None:
+		print('balance.py needs numpy (pip install numpy)', file=sys.stderr)
+		sys.exit(1)
+	hack_p = dict(STRATEGIES, mixed=args.mix)
+	report(simulate(args.battles, args.seed, args.eng_max, args.fix_max, (args.enc_base, args.enc_step, args.final_enc), hack_p, args.max_turns, args.fresh), args.battles, args.fresh)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import game
+import playtest
+from game import FrameWriter, GameOver, NullClock, NullWriter, ScriptedInput, Text, TextBlock, TextColors, TextStyles
+
+## MARK: Constants ##
+COLS, ROWS = 80, 24
+SHORT = 'The ground is covered in a thin layer of water. It looks like one of the containers had burst open!'
+LONG = ' '.join(['\x1b[3{0}m{1}\x1b[m'.format(i % 8, SHORT) if i % 5 == 0 else SHORT for i in range(2000)])
+SAVE_LOGS = 10000
+HEADLESS_SEEDS = 64
+HACK_KEYS = '\n' + 'a\n\n\n' * 64
+DEVNULL = os.open(os.devnull, os.O_WRONLY)
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench-results.jsonl')
+
+## MARK: Harness ##
+def setup(writer=None):
+	game.session.get().rng.seed(0)
+	game.use(reader=ScriptedInput([]), writer=writer or FrameWriter(DEVNULL), timer=NullClock())
+	game.resize(COLS, ROWS)
+	game.new_game().name = 'Bench'
+	game.world.logs.append('> look\n')
+
+def fill_logs(n):
+	logs = game.world.logs
+	max_pages = logs.max_pages
+	logs.max_pages = 0
+	for i in range(n):
+		logs.append('> look\n')
+		logs.write('{0} {1}\n'.format(i, SHORT))
+	logs.max_pages = max_pages
+
+## MARK: Benchmarks ##
+def wrap_short():
+	setup()
+	async def op():
+		game.wrap_text.__wrapped__(SHORT, COLS)
+	return op
+
+def wrap_long():
+	setup()
+	async def op():
+		game.wrap_text.__wrapped__(LONG, COLS)
+	return op
+
+def write_log():
+	setup()
+	block = TextBlock(texts=[Text('[Bench]', fg=TextColors.p_name), Text(SHORT, fg=TextColors.p_head), Text('<look>', styles=[TextStyles.faint])])
+	async def op():
+		await block.write_log()
+		game.flush()
+	return op
+
+def print_map():
+	setup()
+	async def op():
+		game.use(reader=ScriptedInput('\n'))
+		await game.print_map()
+	return op
+
+def print_meters():
+	setup()
+	ticks = iter(range(1 << 62))
+	async def op():
+		game.world.oxy = next(ticks) % (game.world.oxy_max + 1)
+		game.print_meters()
+		game.flush()
+	return op
+
+def save_10k():
+	setup()
+	fill_logs(SAVE_LOGS)
+	path = os.path.join(tempfile.mkdtemp(), 'bench.sav')
+	async def op():
+		await game.run_cmd('save ' + path)
+		game.journal.close()
+		return os.path.getsize(path)
+	return op
+
+def load_10k():
+	setup()
+	fill_logs(SAVE_LOGS)
+	path = os.path.join(tempfile.mkdtemp(), 'bench.sav')
+	game.save_game(path)
+	argv = sys.argv
+	async def op():
+		sys.argv = ['game.py', path]
+		try:
+			await game.init()
+		except EOFError:
+			pass
+		finally:
+			sys.argv = argv
+			game.journal.close()
+	return op
+
+def hack_cpu():
+	setup(NullWriter())
+	async def op():
+		game.use(reader=ScriptedInput(HACK_KEYS))
+		game.session.get().rng.seed(0)
+		game.world.eng = game.world.eng_max = game.ENG_MAX
+		game.world.fix_rooms = [game.world.p_room]
+		game.world.final = False
+		try:
+			await game.hack_cpu()
+		except GameOver:
+			pass
+		game.flush()
+	return op
+
+def headless_game():
+	seeds = iter(range(1 << 62))
+	async def op():
+		seed = next(seeds) % HEADLESS_SEEDS
+		game.session.get().rng.seed(seed)
+		game.use(reader=playtest.Bot(playtest.greedy, seed), writer=NullWriter(), timer=NullClock())
+		game.new_game()
+		await game.play()
+	return op
+
+BENCHMARKS = {bench.__name__: bench for bench in [wrap_short, wrap_long, write_log, print_map, print_meters, save_10k, load_10k, hack_cpu, headless_game]}
+
+## MARK: Measurement ##
+async def timed(bench, seconds):
+	op = bench()
+	await op()
+	written = game.out.bytes
+	extra = n = 0
+	start = time.perf_counter()
+	while True:
+		extra += await op() or 0
+		n += 1
+		elapsed = time.perf_counter() - start
+		if elapsed >= seconds:
+			break
+	return n, elapsed, (game.out.bytes - written + extra) / n
+
+async def traced(bench, n):
+	op = bench()
+	await op()
+	tracemalloc.start()
+	base = tracemalloc.get_traced_memory()[0]
+	for _ in range(n):
+		await op()
+	current, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return (peak - base) / 1024, (current - base) / n
+
+def measure(bench, seconds, repeat):
+	runs = [asyncio.run(timed(bench, seconds)) for _ in range(repeat)]
+	n, elapsed, written = max(runs, key=lambda run: run[0] / run[1])
+	peak, kept = asyncio.run(traced(bench, max(1, n // 10)))
+	return {'ops': round(n / elapsed, 1), 'us': round(1e6 * elapsed / n, 2), 'bytes': round(written), 'peak_kb': round(peak, 1), 'kept': round(kept)}
+
+## MARK: Results ##
+def git(*args):
+	try:
+		return subprocess.run(['git'] + list(args), cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return ''
+
+def load_results(f_name):
+	if not os.path.exists(f_name):
+		return []
+	with open(f_name) as f:
+		return [json.loads(line) for line in f if line.strip()]
+
+def baseline(records, commit, rev=None):
+	for record in reversed(records):
+		if (record['commit'].startswith(rev) if rev else record['commit'] != commit):
+			return record
+	return None
+
+def report(results, base=None):
+	print('{0:<14} {1:>12} {2:>10} {3:>10} {4:>9} {5:>8} {6:>8}'.format('benchmark', 'ops/s', 'us/op', 'bytes/op', 'peak kb', 'kept/op', 'vs base'))
+	for name, result in results.items():
+		old = base['results'].get(name) if base else None
+		delta = '{0:+.1f}%'.format(100 * (result['ops'] / old['ops'] - 1)) if old else ''
+		print('{0:<14} {1[ops]:>12,.1f} {1[us]:>10.2f} {1[bytes]:>10,} {1[peak_kb]:>9,.1f} {1[kept]:>8,} {2:>8}'.format(name, result, delta))
+	if base:
+		print('compared with {0}{1} from {2}'.format(base['commit'][:10], '+' if base['dirty'] else '', base['time']))
+
+## MARK: Main ##
+def main():
+	parser = argparse.ArgumentParser(description='Benchmark rendering, wrapping, save/load and battle paths without a terminal')
+	parser.add_argument('-b', '--bench', action='append', choices=BENCHMARKS.keys(), help='benchmark to run (default: all)')
+	parser.add_argument('-t', '--time', type=float, default=1.0, help='seconds per timed run')
+	parser.add_argument('-r', '--repeat', type=int, default=3, help='timed runs per benchmark, the best one is kept')
+	parser.add_argument('-o', '--results', default=RESULTS, help='JSON lines file the results are appended to')
+	parser.add_argument('--compare', metavar='REV', default=None, help='compare with the last stored run of this commit (default: the last run of another commit)')
+	parser.add_argument('--no-save', action='store_true', help='do not store this run')
+	args = parser.parse_args()
+	results = {name: measure(BENCHMARKS[name], args.time, args.repeat) for name in args.bench or BENCHMARKS}
+	record = {
+		'commit': git('rev-parse', 'HEAD') or 'unknown',
+		'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+		'time': datetime.datetime.now().isoformat(timespec='seconds'),
+		'python': platform.python_version(),
+		'results': results
+	}
+	records = load_results(args.results)
+	report(results, baseline(records, record['commit'], args.compare))
+	if not args.no_save:
+		with open(args.results, 'a') as f:
+			f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+if __name__ == '__main__':
+	main()
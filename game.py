@@ -1,31 +1,271 @@
-import time
+import asyncio
+import bisect
+import codecs
+import collections
+import contextvars
+import copy
+import functools
+import heapq
+import json
+import argparse
+import mmap
+import struct
 import sys
 import shutil
+import socket
+import time
 import tty
 import termios
-import threading
 import random
-import select
+import os
+import atexit
+import signal
+import re
+import unicodedata
+import zlib
 from enum import IntEnum
 
 ## MARK: Constants ##
-LOG_COLS, LOG_ROWS = shutil.get_terminal_size()
 CPU = 'GALILEO'
 CMDS = {'?': 'Print the help page', 'log': 'Read the on-suit log book', 'map': 'View the ship maps', 'look': 'Look around the room', 'examine': 'Interact with an object in the room', 'inventory': 'List items in the inventory', 'use': 'Use an object from the inventory', 'up': 'Move up one room', 'down': 'Move down one room', 'left': 'Move left one room', 'right': 'Move right one room', 'save': 'Save the game', 'quit': 'Quit the game'}
+ALIASES = {'help': '?', 'x': 'examine', 'i': 'inventory', 'l': 'look'}
 SHIP = [
 	[None, 0, None],
 	[1, 2, 3],
 	[4, 5, 6],
 	[7, None, 8]
 ]
+DIRECTIONS = {'up': (-1, 0), 'down': (1, 0), 'left': (0, -1), 'right': (0, 1)}
+OPPOSITE = {'up': 'down', 'down': 'up', 'left': 'right', 'right': 'left'}
 FIX_MAX = 3
 QUICK_MAX = 2
+FIX_POOL = [1, 2, 3, 4, 6, 7, 8]
+QUICK_POOL = [1, 3, 4, 6, 7, 8]
+OXY_MAX = 10
+ENG_MAX = 10
+HACK_ROLL = 5
+HACK_CRIT = 4
+CPU_ROLL = 10
+CPU_ZAP = 3
+CPU_ENCRYPT = 7
+ENC_BASE = 3
+ENC_STEP = 2
+FINAL_ENC = 10
+
+SAVE_MAGIC = b'CSAV'
+LEGACY_MAGIC = b'--NAME--\n'
+SAVE_VERSION = 2
+JOURNAL_MAX = 1 << 16
+LOG_HOT_PAGES = 8
+LOG_HOT_BYTES = 1 << 16
+LOG_MAX_PAGES = 1000
+LIVE_ROOMS = 64
+CATALOGUE_ENTRIES = 256
+SHIP_EXITS = 1 << 14
+SHIP_TREES = 64
+SHIP_CHECKED = 1 << 12
+MAP_LEGEND = 24
 
 class GameOverState(IntEnum):
 	win = 0
 	escape = 1
 	lose = 2
 
+## MARK: Ship layout ##
+class ShipGraph:
+	def __init__(self, grid):
+		self.grid = grid
+		self.rows = len(grid)
+		self.cols = max(len(row) for row in grid)
+		self.spec = None
+		self.bridge = 0
+		self.mainframe = 5
+		self.exit_cache = {}
+		self.trees = collections.OrderedDict()
+		self.coords = {}
+		for i, row in enumerate(grid):
+			for n, ri in enumerate(row):
+				if ri is not None:
+					self.coords[ri] = (i, n)
+
+	def __deepcopy__(self, memo):
+		return self
+
+	def cell(self, i, n):
+		if 0 <= i < len(self.grid) and 0 <= n < len(self.grid[i]):
+			return self.grid[i][n]
+		return None
+
+	def locate(self, ri):
+		return self.coords[ri]
+
+	def kind(self, ri):
+		return ri
+
+	def sample(self, k, pool, rng):
+		return rng.sample(pool, k)
+
+	def exits(self, ri):
+		exits = self.exit_cache.get(ri)
+		if exits is None:
+			if len(self.exit_cache) >= SHIP_EXITS:
+				self.exit_cache.clear()
+			i, n = self.locate(ri)
+			exits = self.exit_cache[ri] = {}
+			for direction, (di, dn) in DIRECTIONS.items():
+				nxt = self.cell(i + di, n + dn)
+				if nxt is not None:
+					exits[direction] = nxt
+		return exits
+
+	def toward(self, goal, blocked):
+		key = (goal, blocked)
+		if key in self.trees:
+			self.trees.move_to_end(key)
+			return self.trees[key]
+		self.trees[key] = PathTree(self, goal, blocked)
+		if len(self.trees) > SHIP_TREES:
+			self.trees.popitem(last=False)
+		return self.trees[key]
+
+	def path(self, start, goal, blocked=frozenset()):
+		if start != goal and all((start, direction) in blocked for direction in self.exits(start)):
+			return None
+		tree = self.toward(goal, blocked)
+		if not tree.search(start):
+			return None
+		path = []
+		while tree.parents[start]:
+			start, direction = tree.parents[start]
+			path.append(direction)
+		return path
+
+	def distance(self, start, goal, blocked=frozenset()):
+		path = self.path(start, goal, blocked)
+		return None if path is None else len(path)
+
+	def reachable(self, start, blocked=frozenset()):
+		seen = {start}
+		queue = collections.deque([start])
+		while queue:
+			ri = queue.popleft()
+			yield ri
+			for direction, nxt in self.exits(ri).items():
+				if nxt not in seen and (ri, direction) not in blocked:
+					seen.add(nxt)
+					queue.append(nxt)
+
+class PathTree:
+	__slots__ = ('ship', 'blocked', 'parents', 'dist', 'done', 'heap', 'target')
+
+	def __init__(self, ship, goal, blocked):
+		self.ship = ship
+		self.blocked = blocked
+		self.parents = {goal: None}
+		self.dist = {goal: 0}
+		self.done = set()
+		self.heap = [(0, 0, goal)]
+		self.target = goal
+
+	def estimate(self, ri):
+		i, n = self.ship.locate(ri)
+		ti, tn = self.ship.locate(self.target)
+		return abs(i - ti) + abs(n - tn)
+
+	def search(self, start):
+		if start in self.done:
+			return True
+		if start != self.target:
+			self.target = start
+			self.heap = [(self.dist[ri] + self.estimate(ri), -self.dist[ri], ri) for ri in {ri for f, g, ri in self.heap if ri not in self.done}]
+			heapq.heapify(self.heap)
+		while self.heap:
+			f, g, ri = heapq.heappop(self.heap)
+			if ri in self.done:
+				continue
+			self.done.add(ri)
+			for direction, nxt in self.ship.exits(ri).items():
+				back = OPPOSITE[direction]
+				if (nxt, back) not in self.blocked and 1 - g < self.dist.get(nxt, 2 - g):
+					self.dist[nxt] = 1 - g
+					self.parents[nxt] = (ri, back)
+					heapq.heappush(self.heap, (1 - g + self.estimate(nxt), g - 1, nxt))
+			if ri == start:
+				return True
+		return False
+
+class ProceduralShip(ShipGraph):
+	def __init__(self, rows, cols, seed=0):
+		if rows < 3 or cols < 1 or rows + cols - 3 < max(FIX_MAX, QUICK_MAX):
+			raise ValueError('{0}x{1} is too small for a ship'.format(rows, cols))
+		self.rows = rows
+		self.cols = cols
+		self.seed = seed
+		self.spec = [rows, cols, seed]
+		self.middle = cols // 2
+		self.depths = {}
+		self.exit_cache = {}
+		self.trees = collections.OrderedDict()
+		self.bridge = 0
+		self.mainframe = self.cell(max(2, rows // 2), self.middle)
+		if rows * cols <= SHIP_CHECKED:
+			kinds = [self.kind(ri) for ri in self.reachable(self.bridge)]
+			for pool, k in [(FIX_POOL, FIX_MAX), (QUICK_POOL, QUICK_MAX)]:
+				if sum(kind in pool for kind in kinds) < k:
+					raise ValueError('{0}x{1}:{2} has too few rooms for its events'.format(rows, cols, seed))
+
+	def roll(self, *key):
+		return zlib.crc32(struct.pack('<{0}q'.format(len(key) + 1), self.seed, *key))
+
+	def depth(self, n):
+		if n == self.middle:
+			return self.rows - 1
+		depth = self.depths.get(n)
+		if depth is None:
+			if len(self.depths) >= SHIP_EXITS:
+				self.depths.clear()
+			depth = self.depths[n] = 1 + self.roll(n) % (self.rows - 1)
+		return depth
+
+	def cell(self, i, n):
+		if not (0 <= i < self.rows and 0 <= n < self.cols):
+			return None
+		elif i == 0:
+			return self.bridge if n == self.middle else None
+		return i * self.cols + n if i <= self.depth(n) else None
+
+	def locate(self, ri):
+		return (0, self.middle) if ri == self.bridge else divmod(ri, self.cols)
+
+	def kind(self, ri):
+		if ri == self.bridge:
+			return 0
+		elif ri == self.mainframe:
+			return 5
+		return FIX_POOL[self.roll(ri, 1) % len(FIX_POOL)]
+
+	def sample(self, k, pool, rng):
+		picked = []
+		for attempt in range(64 * k):
+			ri = self.cell(rng.randrange(1, self.rows), rng.randrange(self.cols))
+			if ri is not None and self.kind(ri) in pool and ri not in picked:
+				picked.append(ri)
+				if len(picked) == k:
+					return picked
+		return rng.sample([ri for ri in self.reachable(self.bridge) if self.kind(ri) in pool], k)
+
+def parse_ship(spec):
+	match = SHIP_SPEC.fullmatch(spec.lower())
+	if match is None:
+		raise ValueError('expected <rows>x<cols>[:seed], got {0!r}'.format(spec))
+	rows, cols, seed = match.groups()
+	return ProceduralShip(int(rows), int(cols), int(seed or 0))
+
+SHIP_SPEC = re.compile(r'(\d+)x(\d+)(?::(\d+))?')
+
+SHIP_GRAPH = ShipGraph(SHIP)
+LOCKED = frozenset([(0, 'down')])
+
 ## MARK: Text customization ##
 class TextStyles(IntEnum):
 	bold = 1
@@ -57,10 +297,28 @@ class TextColors(IntEnum):
 	good = 46
 	warn = 220
 
+PLAIN = (frozenset(), None, None)
+BLANK = (' ', PLAIN)
+
+STYLE_SGR = {style: '\x1b[{0}m'.format(style.value) for style in TextStyles}
+FG_SGR = {color: '\x1b[38;5;{0}m'.format(color.value) for color in TextColors}
+BG_SGR = {color: '\x1b[48;5;{0}m'.format(color.value) for color in TextColors}
+
+@functools.lru_cache(maxsize=None)
+def text_prefix(row, col, styles, fg, bg):
+	mods = '\x1b[{0}H'.format(row) if row else ''
+	mods += '\x1b[{0}G'.format(col) if col is not None else ''
+	mods += ''.join([STYLE_SGR.get(style) or '\x1b[{0}m'.format(style) for style in styles])
+	mods += FG_SGR.get(fg) or '\x1b[38;5;{0}m'.format(fg) if fg else ''
+	mods += BG_SGR.get(bg) or '\x1b[48;5;{0}m'.format(bg) if bg else ''
+	return sys.intern(mods)
+
 class Text:
+	__slots__ = ('text', 'styles', 'fg', 'bg', 'slow', 'delay', 'center', 'row', 'col')
+
 	def __init__(self, text='', styles=None, fg=None, bg=None, slow=False, delay=0.05, center=False, row=None, col=None, end=True):
 		self.text = text + ('\n' if end else '')
-		self.styles = styles if styles else []
+		self.styles = tuple(styles) if styles else ()
 		self.fg = fg
 		self.bg = bg
 		self.slow = slow
@@ -70,114 +328,724 @@ class Text:
 		self.col = None if center else col
 
 	def mods(self):
-		mods = '\x1b[{0}H'.format(self.row) if self.row else ''
-		mods += '\x1b[{0}G'.format(self.col) if self.col else ''
-		mods += '\x1b[{0}G'.format(LOG_COLS // 2 + 1 - len(self.text) // 2) if self.center else ''
-		mods += ''.join(['\x1b[{0}m'.format(style) for style in self.styles])
-		mods += '\x1b[38;5;{0}m'.format(self.fg) if self.fg else ''
-		mods += '\x1b[48;5;{0}m'.format(self.bg) if self.bg else ''
-		return mods
-
-## MARK: Global variables ##
-logs = []
-name = ''
-oxy_max = 10
-eng_max = 10
-oxy = oxy_max
-eng = eng_max
-p_room = 0
-inventory = []
-fix_rooms = random.sample([1, 2, 3, 4, 6, 7, 8], FIX_MAX)
-quick_rooms = random.sample([1, 3, 4, 6, 7, 8], QUICK_MAX)
-final = False
+		col = out.screen.cols // 2 + 1 - len(self.text) // 2 if self.center else self.col or None
+		return text_prefix(self.row, col, self.styles, self.fg, self.bg)
+
+class GameOver(Exception):
+	def __init__(self, state=None):
+		super().__init__(state)
+		self.state = state
+
+## MARK: Game state ##
+Span = collections.namedtuple('Span', ['text', 'styles', 'fg', 'bg', 'row', 'col', 'center', 'wrap'])
+
+def render(span):
+	if isinstance(span, str):
+		return span
+	text = Text(span.text, styles=span.styles, fg=span.fg, bg=span.bg, center=span.center, row=span.row, col=span.col, end=False)
+	if span.wrap:
+		text.text = wrap_text(text.text, out.screen.cols)[0]
+	return text.mods() + text.text + '\x1b[m'
+
+def load_spans(data):
+	return [span if isinstance(span, str) else Span(span[0], tuple(span[1]), *span[2:]) for span in json.loads(data)]
+
+class LogBook:
+	def __init__(self, buf=None, index=0, count=0, version=SAVE_VERSION, max_pages=None):
+		self.buf = buf
+		self.index = index
+		self.count = count
+		self.version = version
+		self.max_pages = LOG_MAX_PAGES if max_pages is None else max_pages
+		self.pages = collections.deque()
+		self.first = 0
+		self.spilled = 0
+		self.hot = 0
+
+	def __len__(self):
+		return max(self.count - self.first, 0) + len(self.pages)
+
+	def __getitem__(self, i):
+		return ''.join(self.chunks(i))
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self[i]
+
+	def __deepcopy__(self, memo):
+		logs = copy.copy(self)
+		logs.pages = collections.deque(list(page) if isinstance(page, list) else page for page in self.pages)
+		return logs
+
+	def raw(self, i):
+		i = self.first + range(len(self))[i]
+		if i < self.count:
+			offset, size = LOG_ENTRY.unpack_from(self.buf, self.index + i * LOG_ENTRY.size)
+			data = self.buf[offset:offset + size]
+			return data if self.version > 1 else json.dumps([data.decode()]).encode()
+		page = self.pages[i - max(self.first, self.count)]
+		return zlib.decompress(page) if isinstance(page, bytes) else json.dumps(page, separators=(',', ':')).encode()
+
+	def spans(self, i):
+		i = range(len(self))[i]
+		kept = max(self.count - self.first, 0)
+		page = self.pages[i - kept] if i >= kept else None
+		return page if isinstance(page, list) else load_spans(self.raw(i))
+
+	def chunks(self, i):
+		return [render(span) for span in self.spans(i)]
+
+	def append(self, span):
+		self.pages.append([span])
+		self.hot += len(span) if isinstance(span, str) else len(span.text)
+		while self.spilled < len(self.pages) - 1 and (len(self.pages) - self.spilled > LOG_HOT_PAGES or self.hot > LOG_HOT_BYTES):
+			self.hot -= self.size(self.pages[self.spilled])
+			self.pages[self.spilled] = zlib.compress(json.dumps(self.pages[self.spilled], separators=(',', ':')).encode())
+			self.spilled += 1
+		while self.max_pages and len(self) > self.max_pages:
+			self.first += 1
+			if self.first <= self.count:
+				continue
+			page = self.pages.popleft()
+			if isinstance(page, list):
+				self.hot -= self.size(page)
+			else:
+				self.spilled -= 1
+
+	def write(self, span):
+		if not len(self):
+			self.append(span)
+			return
+		if not self.pages:
+			page = self.spans(-1)
+			self.count -= 1
+			self.pages.append(page)
+			self.hot += self.size(page)
+		self.pages[-1].append(span)
+		self.hot += len(span) if isinstance(span, str) else len(span.text)
+
+	def size(self, page):
+		return sum(len(span) if isinstance(span, str) else len(span.text) for span in page)
+
+class Rooms:
+	def __init__(self, state):
+		self.state = state
+		self.live = collections.OrderedDict()
+		self.saved = {}
+
+	def __getitem__(self, ri):
+		if ri in self.live:
+			self.live.move_to_end(ri)
+			return self.live[ri]
+		room = Room(self.state.ship.kind(ri))
+		if ri in self.saved:
+			room.load([param == 'True' for param in self.saved.pop(ri).split(',')])
+		else:
+			room.fix_done = ri not in self.state.fix_rooms
+			room.quick_done = ri not in self.state.quick_rooms
+		self.live[ri] = room
+		if len(self.live) > LIVE_ROOMS:
+			self.evict()
+		return room
 
-## MARK: Convenience functions ##
-wait = lambda s: time.sleep(s)
+	def evict(self):
+		ri, room = self.live.popitem(last=False)
+		self.saved[ri] = room.save()
 
-def getch():
-	fd = sys.stdin.fileno()
-	old_settings = termios.tcgetattr(fd)
-	try:
-		tty.setraw(sys.stdin.fileno())
-		ch = sys.stdin.read(1)
-	finally:
-		termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-	return ch
+	def save(self):
+		data = dict(self.saved)
+		for ri, room in self.live.items():
+			data[ri] = room.save()
+		return data
+
+	def load(self, ri, data):
+		self.live.pop(ri, None)
+		self.saved[ri] = data
+
+class GameState:
+	__slots__ = ('name', 'oxy_max', 'eng_max', 'oxy', 'eng', 'p_room', 'inventory', 'fix_rooms', 'quick_rooms', 'final', 'logs', 'ship', 'rooms')
+
+	def __init__(self, ship=None, rng=None):
+		self.logs = LogBook()
+		self.name = ''
+		self.oxy_max = OXY_MAX
+		self.eng_max = ENG_MAX
+		self.oxy = self.oxy_max
+		self.eng = self.eng_max
+		self.ship = ship or SHIP_GRAPH
+		self.p_room = self.ship.bridge
+		self.inventory = []
+		self.roll(rng)
+		self.final = False
+		self.rooms = Rooms(self)
+
+	def roll(self, rng=None):
+		rng = rng or session.get().rng
+		self.fix_rooms = self.ship.sample(FIX_MAX, FIX_POOL, rng)
+		self.quick_rooms = self.ship.sample(QUICK_MAX, QUICK_POOL, rng)
+
+	def copy(self):
+		return copy.deepcopy(self)
+
+def blocked_exits():
+	return LOCKED if world.rooms[0].door_locked else frozenset()
+
+def new_game(ship=None):
+	state = session.get()
+	state.world = GameState(ship, state.rng)
+	state.journal = None
+	return state.world
+
+## MARK: Sessions ##
+class Session:
+	__slots__ = ('name', 'world', 'journal', 'keyboard', 'out', 'clock', 'rng')
+
+	def __init__(self, world=None, reader=None, writer=None, timer=None):
+		self.name = None
+		self.world = world
+		self.journal = None
+		self.keyboard = reader
+		self.out = writer
+		self.clock = timer
+		self.rng = random.Random()
+
+	def reseed(self, seed=None):
+		seed = random.randrange(1 << 63) if seed is None else seed
+		self.rng.seed(seed)
+		self.world.roll(self.rng)
+		return seed
+
+class Current:
+	__slots__ = ('slot',)
+
+	def __init__(self, slot):
+		object.__setattr__(self, 'slot', slot)
+
+	def __getattr__(self, attr):
+		return getattr(getattr(session.get(), self.slot), attr)
+
+	def __setattr__(self, attr, value):
+		setattr(getattr(session.get(), self.slot), attr, value)
+
+	def __bool__(self):
+		return bool(getattr(session.get(), self.slot))
+
+def use(reader=None, writer=None, timer=None):
+	state = session.get()
+	state.keyboard = reader or state.keyboard
+	state.out = writer or state.out
+	state.clock = timer or state.clock
+
+session = contextvars.ContextVar('session', default=Session())
+world = Current('world')
+journal = Current('journal')
+keyboard = Current('keyboard')
+out = Current('out')
+clock = Current('clock')
+rng = Current('rng')
 
-## MARK: Cursor position ##
-class PosThread(threading.Thread):
+## MARK: Convenience functions ##
+async def wait(s):
+	flush()
+	await clock.pause(s)
+
+async def getch(ask=None):
+	flush()
+	clock.skipping = False
+	key = await keyboard.get(ask)
+	if out.recorder:
+		out.recorder.answer(key)
+	return key
+
+## MARK: Timing ##
+class Clock:
+	def __init__(self, paced=True):
+		self.paced = paced
+		self.skipping = False
+		self.skip = None
+
+	def pacing(self):
+		return self.paced and not self.skipping
+
+	async def sleep(self, s):
+		await asyncio.sleep(s)
+
+	async def pause(self, s):
+		if not self.pacing():
+			await asyncio.sleep(0)
+			return
+		self.skip = asyncio.get_running_loop().create_future()
+		await asyncio.wait([self.skip], timeout=s)
+		self.skip = None
+
+	def fast_forward(self):
+		if self.skip is None or self.skip.done():
+			return False
+		self.skipping = True
+		self.skip.set_result(None)
+		return True
+
+class NullClock(Clock):
 	def __init__(self):
-		self.cursor_pos = ''
-		threading.Thread.__init__(self)
+		super().__init__(paced=False)
+
+	async def sleep(self, s):
+		await asyncio.sleep(0)
+
+use(timer=Clock())
+
+## MARK: Keyboard ##
+class Keyboard:
+	def __init__(self, fd):
+		self.fd = fd
+		self.keys = asyncio.Queue()
+		self.pending = ''
+		self.decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+		self.position = None
+		self.old_settings = None
+		self.waiting = False
+
+	def start(self):
+		self.old_settings = termios.tcgetattr(self.fd)
+		tty.setcbreak(self.fd)
+		asyncio.get_running_loop().add_reader(self.fd, self.read)
+
+	def stop(self):
+		asyncio.get_running_loop().remove_reader(self.fd)
+		termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_settings)
 
-	def run(self):
-		fd = sys.stdin.fileno()
-		old_settings = termios.tcgetattr(fd)
+	async def get(self, ask=None):
+		self.waiting = True
 		try:
-			tty.setraw(sys.stdin.fileno())
-			ch = sys.stdin.read(1)
-			while(ch != 'R'):
-				ch = sys.stdin.read(1)
-				self.cursor_pos += ch
+			return await self.keys.get()
 		finally:
-			termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-
-def cursor_pos():
-	print('\x1b7', end='')
-	sys.stdout.flush()
-	thread = PosThread()
-	thread.start()
-	print('\x1b[6n\x1b[F')
-	sys.stdout.flush()
-	thread.join()
-	print('\x1b8', end='')
-	sys.stdout.flush()
-	return [int(coord) for coord in thread.cursor_pos[1:-1].split(';')]
+			self.waiting = False
+
+	def read(self):
+		data = os.read(self.fd, 1024)
+		if out.recorder:
+			out.recorder.input(data)
+		self.feed(self.decoder.decode(data))
+
+	def feed(self, text):
+		pending = self.pending + text
+		i = 0
+		while i < len(pending):
+			match = KEY_SEQ.match(pending, i)
+			if match is None:
+				partial = KEY_PARTIAL.match(pending, i)
+				if partial.end() == len(pending) and len(pending) - i <= KEY_PENDING:
+					break
+				i = partial.end()
+				continue
+			i = match.end()
+			if match.group(1) and self.position and not self.position.done():
+				self.position.set_result([int(match.group(1)), int(match.group(2))])
+			elif not match.group(1) and (self.waiting or not clock.fast_forward()):
+				self.keys.put_nowait(match.group(0))
+		self.pending = pending[i:]
+
+	async def query_pos(self):
+		self.position = asyncio.get_running_loop().create_future()
+		flush()
+		os.write(out.fd, b'\x1b[6n')
+		return await self.position
+
+KEY_SEQ = re.compile(r'\x1b\[(\d+);(\d+)R|\x1b\[[0-9;]*[A-Za-z~]|\x1b(?!\[|$)|[^\x1b]')
+KEY_PARTIAL = re.compile(r'\x1b\[?[0-9;]*')
+KEY_PENDING = 32
+use(reader=Keyboard(sys.stdin.fileno()))
+
+async def readline(prompt, ask=None):
+	write(prompt)
+	line = ''
+	while True:
+		ch = await getch(ask)
+		if ch == '\n' or ch == '\r':
+			write('\n')
+			return line
+		elif ch == '\x7f' or ch == '\b':
+			if line:
+				line = line[:-1]
+				write('\b \b')
+		elif ch.isprintable() and len(line) + len(prompt) < out.screen.cols - 1:
+			line += ch
+			write(ch)
+
+class Screen:
+	def __init__(self, rows, cols, pen=PLAIN, grid=True):
+		self.row = self.col = None
+		self.pen = pen
+		self.saved = (None, None, pen)
+		self.grid = grid
+		self.resize(rows, cols)
+
+	def resize(self, rows, cols):
+		self.rows = rows
+		self.cols = cols
+		self.cells = [[None] * (cols + 1) for _ in range(rows + 1)] if self.grid else None
+		self.row = self.col = None
+
+	def forget(self, row=1):
+		if self.grid:
+			for r in range(max(row, 1), self.rows + 1):
+				self.cells[r] = [None] * (self.cols + 1)
+
+	def invalidate(self):
+		self.row = self.col = None
+
+	def pos(self):
+		return [self.row, min(self.col, self.cols) if self.col else None]
+
+	def erase(self, row, start, stop):
+		if not self.grid:
+			return
+		blank = (' ', (frozenset(), None, self.pen[2])) if self.pen else None
+		for c in range(start, stop + 1):
+			self.cells[row][c] = blank
+
+	def newline(self):
+		if self.row is None:
+			return
+		if self.row == self.rows and self.grid:
+			del self.cells[1]
+			self.cells.append([None] * (self.cols + 1))
+			self.erase(self.rows, 1, self.cols)
+		elif self.row < self.rows:
+			self.row += 1
+
+	def put(self, c):
+		if self.row is None or self.col is None:
+			self.forget()
+			return
+		if self.col > self.cols:
+			self.newline()
+			self.col = 1
+		if not self.grid:
+			self.col += 1
+			return
+		cell = None if self.pen is None else (c, self.pen)
+		self.cells[self.row][self.col] = cell
+		if unicodedata.east_asian_width(c) in 'WF' and self.col < self.cols:
+			self.col += 1
+			self.cells[self.row][self.col] = None if cell is None else ('', self.pen)
+		self.col += 1
+
+	def advance(self, text):
+		for i, line in enumerate(text.split('\n')):
+			if i:
+				self.newline()
+				self.col = 1
+			n = len(line)
+			while n:
+				if self.col > self.cols:
+					self.newline()
+					self.col = 1
+				step = min(n, self.cols + 1 - self.col)
+				self.col += step
+				n -= step
+
+	def track(self, s):
+		for match in ESC_SEQ.finditer(s):
+			if match.group(1) is not None:
+				params = [int(p) if p else None for p in match.group(1).split(';')]
+				cmd = match.group(2)
+				if cmd == 'm':
+					self.pen = sgr(params, self.pen or PLAIN) if self.grid else self.pen
+				elif cmd == 'H':
+					self.row = min(params[0] or 1, self.rows)
+					self.col = min(params[1] or 1, self.cols) if len(params) > 1 else 1
+				elif cmd == 'G':
+					self.col = min(params[0] or 1, self.cols)
+				elif cmd == 'F':
+					self.row = max(self.row - (params[0] or 1), 1) if self.row else None
+					self.col = 1
+				elif cmd == 'J' and self.row is not None and self.col is not None:
+					start = 1 if params[0] == 2 else self.row + 1
+					if params[0] != 2:
+						self.erase(self.row, min(self.col, self.cols), self.cols)
+					for r in range(start, self.rows + 1):
+						self.erase(r, 1, self.cols)
+				elif cmd == 'K' and self.row is not None and self.col is not None:
+					self.erase(self.row, 1 if params[0] == 2 else min(self.col, self.cols), self.cols)
+				elif cmd in 'JK':
+					self.forget()
+				elif cmd != 'n':
+					self.invalidate()
+			elif match.group(3) == '7':
+				self.saved = (self.row, self.col, self.pen)
+			elif match.group(3) == '8':
+				self.row, self.col, self.pen = self.saved
+			elif not self.grid and self.col is not None and '\r' not in match.group(4) and '\b' not in match.group(4):
+				self.advance(match.group(4))
+			else:
+				for c in match.group(4):
+					if c == '\n':
+						self.newline()
+						self.col = 1
+					elif c == '\r':
+						self.col = 1
+					elif c == '\b':
+						self.col = max(min(self.col, self.cols) - 1, 1) if self.col else None
+					else:
+						self.put(c)
+
+	def dump(self):
+		parts = ['\x1b[m\x1b[2J']
+		if not self.grid:
+			return parts[0]
+		pen = PLAIN
+		for r in range(1, self.rows + 1):
+			row = self.cells[r]
+			last = self.cols
+			while last and row[last] in (None, BLANK):
+				last -= 1
+			if last:
+				parts.append('\x1b[{0}H'.format(r))
+			for c in range(1, last + 1):
+				char, cell_pen = row[c] or BLANK
+				if cell_pen != pen:
+					parts.append(pen_mods(cell_pen))
+					pen = cell_pen
+				parts.append(char)
+		if self.row and self.col:
+			parts.append('\x1b[{0};{1}H'.format(self.row, min(self.col, self.cols)))
+		parts.append(pen_mods(self.pen or PLAIN))
+		return ''.join(parts)
+
+ESC_SEQ = re.compile(r'\x1b\[([0-9;]*)([A-Za-z])|\x1b([78])|([^\x1b]+)')
+
+## MARK: Output ##
+def sgr(params, pen):
+	styles, fg, bg = pen
+	styles = set(styles)
+	params = [p or 0 for p in params]
+	i = 0
+	while i < len(params):
+		if params[i] == 0:
+			styles, fg, bg = set(), None, None
+		elif params[i] in (38, 48) and i + 2 < len(params):
+			if params[i] == 38:
+				fg = params[i + 2]
+			else:
+				bg = params[i + 2]
+			i += 2
+		else:
+			styles.add(params[i])
+		i += 1
+	return (frozenset(styles), fg, bg)
+
+def pen_mods(pen):
+	styles, fg, bg = pen
+	mods = '\x1b[m'
+	mods += ''.join(['\x1b[{0}m'.format(style) for style in sorted(styles)])
+	mods += '\x1b[38;5;{0}m'.format(fg) if fg is not None else ''
+	mods += '\x1b[48;5;{0}m'.format(bg) if bg is not None else ''
+	return mods
+
+class FrameWriter:
+	def __init__(self, fd, grid=True):
+		self.fd = fd
+		self.frame = []
+		cols, rows = shutil.get_terminal_size()
+		self.screen = Screen(rows, cols, pen=None, grid=grid)
+		self.back = Screen(rows, cols, grid=grid)
+		self.pen = PLAIN
+		self.target = None
+		self.writes = 0
+		self.bytes = 0
+		self.recorder = None
+		self.broadcast = None
+
+	def emit(self, s):
+		self.frame.append(s)
+		self.screen.track(s)
+
+	def place(self):
+		if self.target:
+			row, col = self.target
+			self.target = None
+			if row is None or row == self.screen.row:
+				if col != self.screen.col:
+					self.emit('\x1b[{0}G'.format(col))
+			elif col == 1:
+				self.emit('\x1b[{0}H'.format(row))
+			else:
+				self.emit('\x1b[{0};{1}H'.format(row, col))
+
+	def paint(self):
+		current = self.screen.pen
+		if self.pen == current:
+			return
+		styles, fg, bg = self.pen
+		if current and current[0] <= styles and current[1] in (None, fg) and current[2] in (None, bg):
+			params = sorted(styles - current[0])
+			params += [38, 5, fg] if fg != current[1] else []
+			params += [48, 5, bg] if bg != current[2] else []
+		else:
+			params = [] if current == PLAIN else [0]
+			params += sorted(styles)
+			params += [38, 5, fg] if fg is not None else []
+			params += [48, 5, bg] if bg is not None else []
+		self.emit('\x1b[{0}m'.format(';'.join([str(p) for p in params])) if params != [0] else '\x1b[m')
+
+	def write(self, s):
+		for match in ESC_SEQ.finditer(s):
+			if match.group(1) is not None:
+				params = [int(p) if p else None for p in match.group(1).split(';')]
+				cmd = match.group(2)
+				if cmd == 'm':
+					self.pen = sgr(params, self.pen)
+				elif cmd == 'H':
+					self.target = (params[0] or 1, params[1] or 1 if len(params) > 1 else 1)
+				elif cmd == 'G':
+					self.target = (self.target[0] if self.target else None, params[0] or 1)
+				else:
+					self.place()
+					self.paint()
+					self.emit(match.group(0))
+			elif match.group(3) == '7':
+				self.place()
+				self.paint()
+				self.emit(match.group(0))
+			elif match.group(3) == '8':
+				self.target = None
+				self.emit(match.group(0))
+				self.pen = self.screen.pen or PLAIN
+			else:
+				self.place()
+				self.paint()
+				self.emit(match.group(4))
+
+	def damaged(self, back, r, c):
+		return back.cells[r][c] is not None and back.cells[r][c] != self.screen.cells[r][c]
+
+	def present(self, rows):
+		back = self.back
+		if len(rows) == back.rows and any([None in row[1:] for row in self.screen.cells[1:]]):
+			self.write('\x1b[m\x1b7\x1b[2J\x1b8')
+		damage = ''
+		for r in rows:
+			last = back.cols
+			while last and back.cells[r][last] == BLANK:
+				last -= 1
+			c = 1
+			while c <= last:
+				if not self.damaged(back, r, c):
+					c += 1
+					continue
+				damage += '\x1b[{0};{1}H'.format(r, c)
+				while c <= last and back.cells[r][c] is not None and any([self.damaged(back, r, n) for n in range(c, min(c + 4, last + 1))]):
+					char, pen = back.cells[r][c]
+					damage += pen_mods(pen) + char
+					c += 1
+			if any([self.damaged(back, r, n) for n in range(last + 1, back.cols + 1)]):
+				damage += '\x1b[{0};{1}H\x1b[m\x1b[K'.format(r, last + 1)
+		if damage:
+			self.write('\x1b7' + damage + '\x1b8')
+
+	def publish(self, data):
+		if self.recorder:
+			self.recorder.output(data)
+		if self.broadcast:
+			self.broadcast.output(data)
+
+	def pos(self):
+		row, col = self.screen.pos()
+		if self.target:
+			row = self.target[0] or row
+			col = self.target[1]
+		return [row, col]
+
+	def flush(self):
+		self.place()
+		data = ''.join(self.frame).encode()
+		self.frame = []
+		if data:
+			self.publish(data)
+		while data:
+			n = os.write(self.fd, data)
+			data = data[n:]
+			self.writes += 1
+			self.bytes += n
+
+use(writer=FrameWriter(sys.stdout.fileno()))
+atexit.register(lambda: out.flush())
+
+async def cursor_pos():
+	if None in out.pos():
+		out.screen.row, out.screen.col = await keyboard.query_pos()
+	return out.pos()
+
+def write(s):
+	out.write(s)
+
+def flush():
+	out.flush()
+
+def resize(cols=None, rows=None):
+	cols, rows = (cols, rows) if cols else shutil.get_terminal_size()
+	out.screen.resize(rows, cols)
+	out.back.resize(rows, cols)
+	if out.recorder:
+		out.recorder.resize(cols, rows)
 
 ## MARK: Printing to console ##
-def n_text(text):
-	text_lines = text.text.split('\n')
-	for i, line in enumerate(text_lines):
-		if len(line) > LOG_COLS - 3:
-			end_space = line.rfind(' ', 0, LOG_COLS)
+VISIBLE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]|\x1b[78]|(.)', re.S)
+
+@functools.lru_cache(maxsize=4096)
+def wrap_text(text, cols):
+	wrapped = []
+	for line in text.split('\n'):
+		vis = [m.start(1) for m in VISIBLE.finditer(line) if m.group(1)] if '\x1b' in line else range(len(line))
+		start = p = 0
+		while len(vis) - p > cols - 3:
+			end_space = line.rfind(' ', start, vis[p + cols] if p + cols < len(vis) else len(line))
 			if end_space >= 0:
-				text_lines[i] = line[:end_space] + '\n' + n_text(Text(line[end_space + 1:], end=False))
+				wrapped.append(line[start:end_space])
+				start = end_space + 1
+				p = bisect.bisect_left(vis, start)
 			else:
-				text_lines[i] = line[:LOG_COLS - 3] + '\n' + n_text(Text(line[LOG_COLS - 3:], end=False))
-	return '\n'.join(text_lines)
+				p += cols - 3
+				wrapped.append(line[start:vis[p]])
+				start = vis[p]
+		wrapped.append(line[start:])
+	return '\n'.join(wrapped), len(wrapped) - 1
 
 def clear_log(r=1):
-	print('\x1b[{0}H\x1b[J'.format(r), end='')
-	sys.stdout.flush()
+	write('\x1b[{0}H\x1b[J'.format(r))
 
-def log(text, save=True, clear=False, clear_row=1, validate=True):
-	global logs
+async def log(text, save=True, clear=False, clear_row=1, validate=True):
+	raw = text.text
 	if validate:
-		c_row, c_col = cursor_pos()
-		text.text = n_text(text)
-		if c_row + sum([1 for c in text.text if c == '\n']) > LOG_ROWS:
+		c_row, c_col = await cursor_pos()
+		text.text, lines = wrap_text(text.text, out.screen.cols)
+		if c_row + lines > out.screen.rows:
 			clear_row = 2
 			text.row = 3
 			clear = True
 	clear_log(clear_row) if clear else None
-	print(text.mods(), end='')
-	sys.stdout.flush()
-	if text.slow:
-		for c in text.text:
-			sys.stdout.write(c)
-			sys.stdout.flush()
-			wait(text.delay)
+	write(text.mods())
+	if text.slow and clock.pacing():
+		for i, c in enumerate(text.text):
+			write(c)
+			await wait(text.delay)
+			if not clock.pacing():
+				write(text.text[i + 1:])
+				break
 	else:
-		print(text.text, end='')
-	print('\x1b[m', end='')
-	sys.stdout.flush()
+		write(text.text)
+	write('\x1b[m')
 	if save:
+		span = Span(raw, text.styles, text.fg, text.bg, text.row, text.col, text.center, validate)
 		if clear:
-			logs.append(text.mods() + text.text + '\x1b[m')
+			world.logs.append(span)
 		else:
-			logs[-1] += text.mods() + text.text + '\x1b[m'
+			world.logs.write(span)
 
 class TextBlock:
+	__slots__ = ('texts', 'save', 'validate', 'extra')
+
 	def __init__(self, texts=None, save=True, validate=True, extra=1):
 		self.texts = texts if texts else []
 		self.save = save
@@ -187,57 +1055,69 @@ class TextBlock:
 	def add_text(self, text):
 		self.texts.append(text)
 
-	def write_log(self):
+	async def write_log(self):
 		if self.validate:
-			lines = sum([sum([1 for c in n_text(text) if c == '\n']) for text in self.texts])
-			c_row, c_col = cursor_pos()
-			if c_row + lines > LOG_ROWS - self.extra:
-				log(Text(row=3, end=False), clear=True, clear_row=2)
-		[log(text, save=self.save, validate=self.validate) for text in self.texts]
-
-def prompt(allowed=[], blocked=[], lower=True, main=True, save=True):
-	global logs
-	c_row, c_col = cursor_pos()
-	if c_row + 1 > LOG_ROWS:
-		log(Text(row=3, end=False), clear=True, save=save)
+			lines = sum([wrap_text(text.text, out.screen.cols)[1] for text in self.texts])
+			c_row, c_col = await cursor_pos()
+			if c_row + lines > out.screen.rows - self.extra:
+				await log(Text(row=3, end=False), clear=True, clear_row=2)
+		[await log(text, save=self.save, validate=self.validate) for text in self.texts]
+
+	def draw(self, screen):
+		[screen.track(text.mods() + text.text + '\x1b[m') for text in self.texts]
+
+async def prompt(allowed=[], blocked=[], lower=True, main=True, save=True, topic='option'):
+	if journal:
+		journal.sync()
+	c_row, c_col = await cursor_pos()
+	if c_row + 1 > out.screen.rows:
+		await log(Text(row=3, end=False), clear=True, save=save)
 		print_meters()
-	text = input('\x1b7> ' if main else '\x1b7$ ')
+	ask = (topic, list(allowed))
+	text = await readline('\x1b7> ' if main else '\x1b7$ ', ask)
 	if lower:
 		text = text.lower()
-	while (allowed and text.strip() not in allowed) or (blocked and text.strip() in blocked) or len(text) > LOG_COLS - 3:
-		text = input('\x1b8\x1b[J> ' if main else '\x1b8\x1b[J$ ')
+	while (allowed and text.strip() not in allowed) or (blocked and text.strip() in blocked) or len(text) > out.screen.cols - 3:
+		text = await readline('\x1b8\x1b[J> ' if main else '\x1b8\x1b[J$ ', ask)
 		if lower:
 			text = text.lower()
 	if save:
-		logs[-1] += '{0} {1}\n'.format('>' if main else '$', text.strip())
+		world.logs.write(Span('{0} {1}\n'.format('>' if main else '$', text.strip()), (), None, None, None, None, False, False))
 	return text.strip()
 
 spacer = lambda n=1: Text('\n' * (n - 1))
+ENTER = ('continue', ['\n'])
 
-def next():
-	log(Text('<Press enter to continue>', styles=[TextStyles.faint], end=False), save=False)
-	getch()
+async def next():
+	await log(Text('<Press enter to continue>', styles=[TextStyles.faint], end=False), save=False)
+	await getch(ENTER)
 
-def print_meters():
-	print('\x1b7', end='')
-	sys.stdout.flush()
+def meter_block():
 	meter_block = TextBlock(save=False, validate=False)
 	meter_block.add_text(Text('\x1b[2KO2: [', row=1, end=False))
-	meter_block.add_text(Text('{0}'.format('=' * oxy).ljust(oxy_max), fg=TextColors.oxy, end=False))
-	meter_block.add_text(Text('] {0}/{1} | \u26A1: ['.format(oxy, oxy_max), end=False))
-	meter_block.add_text(Text('{0}'.format('=' * eng).ljust(eng_max), fg=TextColors.eng, end=False))
-	meter_block.add_text(Text('] {0}/{1} | Help (?)'.format(eng, eng_max), end=False))
-	meter_block.write_log()
-	print('\x1b8', end='')
-	sys.stdout.flush()
+	meter_block.add_text(Text('{0}'.format('=' * world.oxy).ljust(world.oxy_max), fg=TextColors.oxy, end=False))
+	meter_block.add_text(Text('] {0}/{1} | \u26A1: ['.format(world.oxy, world.oxy_max), end=False))
+	meter_block.add_text(Text('{0}'.format('=' * world.eng).ljust(world.eng_max), fg=TextColors.eng, end=False))
+	meter_block.add_text(Text('] {0}/{1} | Help (?)'.format(world.eng, world.eng_max), end=False))
+	return meter_block
+
+def print_meters():
+	meter_block().draw(out.back)
+	out.present([1])
 
 def to_game(show_meters=True):
-	log(Text(logs[-1], end=False), save=False, clear=True, validate=False)
-	print_meters() if show_meters else None
+	out.back.track('\x1b[m\x1b[H\x1b[2J')
+	for chunk in world.logs.chunks(-1):
+		out.back.track(chunk)
+	out.back.track('\x1b[m\x1b7')
+	meter_block().draw(out.back) if show_meters else None
+	out.back.track('\x1b8')
+	out.present(range(1, out.back.rows + 1))
+	write('\x1b[{0};{1}H'.format(out.back.row, min(out.back.col, out.back.cols)))
 
 ## MAKR: Game over ##
-def end(state=GameOverState.win):
-	log(Text(row=3, end=False), save=False, clear=True, validate=False)
+async def end(state=GameOverState.win):
+	await log(Text(row=3, end=False), save=False, clear=True, validate=False)
 	end_block = TextBlock(save=False, validate=False)
 	if state == GameOverState.win:
 		end_block.add_text(Text('Game Over', styles=[TextStyles.bold, TextStyles.underline], fg=TextColors.good, center=True))
@@ -284,159 +1164,154 @@ def end(state=GameOverState.win):
 	end_block.add_text(spacer())
 	end_block.add_text(Text('CENTAURI', styles=[TextStyles.bold, TextStyles.underline], fg=TextColors.title, slow=True, delay=0.2, center=True))
 	end_block.add_text(spacer())
-	end_block.write_log()
-	exit()
+	await end_block.write_log()
+	raise GameOver(state)
 
 ## MARK: CPU fight ##
 def battle_meters(enc, enc_max):
-	print('\x1b7', end='')
-	sys.stdout.flush()
 	battle_block = TextBlock(save=False, validate=False)
-	battle_block.add_text(Text('\u26A1: [', row=1, end=False))
-	battle_block.add_text(Text('{0}'.format('=' * eng).ljust(eng_max), fg=TextColors.eng, end=False))
-	battle_block.add_text(Text('] {0}/{1} | CPU Encryption: ['.format(eng, eng_max), end=False))
+	battle_block.add_text(Text('\x1b[2K\u26A1: [', row=1, end=False))
+	battle_block.add_text(Text('{0}'.format('=' * world.eng).ljust(world.eng_max), fg=TextColors.eng, end=False))
+	battle_block.add_text(Text('] {0}/{1} | CPU Encryption: ['.format(world.eng, world.eng_max), end=False))
 	battle_block.add_text(Text('{0}'.format('=' * enc).ljust(enc_max), fg=TextColors.enc, end=False))
 	battle_block.add_text(Text('] {0}/{1}'.format(enc, enc_max), end=False))
-	battle_block.write_log()
-	print('\x1b8', end='')
-	sys.stdout.flush()
+	battle_block.draw(out.back)
+	out.present([1])
+
+def encryption(battle, fix_max=FIX_MAX, base=ENC_BASE, step=ENC_STEP, final_enc=FINAL_ENC):
+	return final_enc if battle == fix_max else base + step * battle
 
-def hack_cpu():
-	global eng, eng_max, final, fix_rooms
+async def hack_turn(enc):
+	p_safe = False
+	hack_block = TextBlock(save=False, validate=False)
+	hack_block.add_text(Text('What would you like to do?', row=3))
+	hack_block.add_text(Text('a) Hack', end=False))
+	hack_block.add_text(Text(' <lowers {0}\'s encryption by 1 (crit=2) point(s)>'.format(CPU), styles=[TextStyles.faint]))
+	hack_block.add_text(Text('b) Take hands off keyboard', end=False))
+	hack_block.add_text(Text(' <protects against being zapped>', styles=[TextStyles.faint]))
+	hack_block.add_text(spacer())
+	await hack_block.write_log()
+	option = await prompt(allowed=['a', 'b'], main=False, save=False, topic='hack')
+	if option == 'a':
+		crit = rng.randint(0, HACK_ROLL)
+		if crit < HACK_CRIT:
+			enc -= 1
+			await TextBlock(texts=[Text('Decreased encryption by 1 point')], save=False, validate=False, extra=2).write_log()
+		else:
+			enc -= 2
+			await TextBlock(texts=[Text('Critical hack!', fg=TextColors.crit, end=False) ,Text(' Decreased encryption by 2 points')], save=False, validate=False, extra=2).write_log()
+	else:
+		p_safe = True
+		await TextBlock(texts=[Text('Lifted hands off keyboard')], save=False, validate=False, extra=2).write_log()
+	return enc, p_safe
+
+async def cpu_turn(enc, enc_max, p_safe):
+	hack_block = TextBlock(texts=[Text(row=3, end=False)] ,save=False, validate=False, extra=2)
+	cpu_action = rng.randint(0, CPU_ROLL)
+	if cpu_action < CPU_ZAP:
+		hack_block.add_text(Text('{0} is computing...'.format(CPU)))
+	elif cpu_action < CPU_ENCRYPT:
+		if p_safe:
+			hack_block.add_text(Text('The keyboard sparks! Good thing I lifted my hands.'))	
+		else:
+			world.eng -= 1
+			hack_block.add_text(Text('Ouch!'))
+	else:
+		enc += 1 if enc < enc_max else 0
+		hack_block.add_text(Text('Re-encrypting files...'))
+	await hack_block.write_log()
+	return enc
+
+async def hack_cpu():
 	intro_block = TextBlock(extra=2)
-	intro_block.add_text(Text('[{0}]'.format(name), fg=TextColors.p_name))
+	intro_block.add_text(Text('[{0}]'.format(world.name), fg=TextColors.p_name))
 	intro_block.add_text(Text('Something must be wrong with {0}. I\'ll have to hack into the mainframe and fix the problem.'.format(CPU), fg=TextColors.p_head))
 	intro_block.add_text(spacer())
 	intro_block.add_text(Text('[{0}]'.format(CPU), fg=TextColors.cpu_name))
 	intro_block.add_text(Text('Threat detected.', fg=TextColors.danger, slow=True))
 	intro_block.add_text(Text('Initializing defence protocol', fg=TextColors.cpu, slow=True, end=False))
 	intro_block.add_text(Text('...', fg=TextColors.cpu, slow=True, delay=1))
-	battle = FIX_MAX - len(fix_rooms)
-	enc = enc_max = 3 + 2 * battle
+	battle = FIX_MAX - len(world.fix_rooms)
+	enc = enc_max = encryption(battle)
 	intro_block.add_text(Text('Encryption algorithm V{0} loaded.'.format(battle + 1), fg=TextColors.cpu, slow=True))
 	if battle == FIX_MAX:
 		intro_block.add_text(spacer())
-		intro_block.add_text(Text('[{0}]'.format(name), fg=TextColors.p_name))
-		intro_block.add_text(Text('Wait! I needed root access to fix issues with the ship. I\'m your supervisor, {0}, remember?'.format(name)))
+		intro_block.add_text(Text('[{0}]'.format(world.name), fg=TextColors.p_name))
+		intro_block.add_text(Text('Wait! I needed root access to fix issues with the ship. I\'m your supervisor, {0}, remember?'.format(world.name)))
 		intro_block.add_text(spacer())
 		intro_block.add_text(Text('[{0}]'.format(CPU), fg=TextColors.cpu_name))
-		intro_block.add_text(Text('I\'m sorry, {0}, but I\'m afraid I can\'t do that.'.format(name), fg=TextColors.cpu, slow=True))
+		intro_block.add_text(Text('I\'m sorry, {0}, but I\'m afraid I can\'t do that.'.format(world.name), fg=TextColors.cpu, slow=True))
 		intro_block.add_text(Text('Neutralizing threat', fg=TextColors.cpu, slow=True, end=False))
 		intro_block.add_text(Text('...', fg=TextColors.cpu, slow=True, delay=1))
-		enc = enc_max = 10
 	intro_block.add_text(spacer())
-	intro_block.write_log()
-	next()
+	await intro_block.write_log()
+	await next()
 	p_turn = True
 	p_safe = False
-	while enc > 0 and eng > 0:
-		log(Text(end=False), save=False, clear=True, validate=False)
+	while enc > 0 and world.eng > 0:
+		await log(Text(end=False), save=False, clear=True, validate=False)
 		battle_meters(enc, enc_max)
 		if p_turn:
-			p_safe = False
-			hack_block = TextBlock(save=False, validate=False)
-			hack_block.add_text(Text('What would you like to do?', row=3))
-			hack_block.add_text(Text('a) Hack', end=False))
-			hack_block.add_text(Text(' <lowers {0}\'s encryption by 1 (crit=2) point(s)>'.format(CPU), styles=[TextStyles.faint]))
-			hack_block.add_text(Text('b) Take hands off keyboard', end=False))
-			hack_block.add_text(Text(' <protects against being zapped>', styles=[TextStyles.faint]))
-			hack_block.add_text(spacer())
-			hack_block.write_log()
-			option = prompt(allowed=['a', 'b'], main=False, save=False)
-			if option == 'a':
-				crit = random.randint(0, 5)
-				if crit < 4:
-					enc -= 1
-					TextBlock(texts=[Text('Decreased encryption by 1 point')], save=False, validate=False, extra=2).write_log()
-				else:
-					enc -= 2
-					TextBlock(texts=[Text('Critical hack!', fg=TextColors.crit, end=False) ,Text(' Decreased encryption by 2 points')], save=False, validate=False, extra=2).write_log()
-			else:
-				p_safe = True
-				TextBlock(texts=[Text('Lifted hands off keyboard')], save=False, validate=False, extra=2).write_log()
+			enc, p_safe = await hack_turn(enc)
 		else:
-			hack_block = TextBlock(texts=[Text(row=3, end=False)] ,save=False, validate=False, extra=2)
-			cpu_action = random.randint(0, 10)
-			if cpu_action < 3:
-				hack_block.add_text(Text('{0} is computing...'.format(CPU)))
-			elif cpu_action < 7:
-				if p_safe:
-					hack_block.add_text(Text('The keyboard sparks! Good thing I lifted my hands.'))	
-				else:
-					eng -= 1
-					hack_block.add_text(Text('Ouch!'))
-			else:
-				enc += 1 if enc < enc_max else 0
-				hack_block.add_text(Text('Re-encrypting files...'))
-			hack_block.write_log()
+			enc = await cpu_turn(enc, enc_max, p_safe)
 		p_turn = not p_turn
-		next()
-	if eng == 0:
-		end(state=GameOverState.lose)
-	eng_max += 1
-	eng += 1
-	if fix_rooms:
-		fix_rooms.remove(p_room)
-	if not fix_rooms and not final:
-		final = True
-		log(spacer(), save=False)
-		TextBlock(texts=[Text('All the issues should be fixed now. I need to go to the mainframe and reprogram {0} to open the cryopod.'.format(CPU), fg=TextColors.p_head), spacer()], extra=2).write_log()
-		next()
-	elif final:
-		log(spacer(), save=False)
-		TextBlock(texts=[Text('Ok, I removed myself from {0}\'s threat data store. I should get back to the cryopod now.'.format(CPU), fg=TextColors.p_head), spacer()], extra=2).write_log()
-		next()
+		await next()
+	if world.eng == 0:
+		await end(state=GameOverState.lose)
+	world.eng_max += 1
+	world.eng += 1
+	if world.fix_rooms:
+		world.fix_rooms.remove(world.p_room)
+	if not world.fix_rooms and not world.final:
+		world.final = True
+		await log(spacer(), save=False)
+		await TextBlock(texts=[Text('All the issues should be fixed now. I need to go to the mainframe and reprogram {0} to open the cryopod.'.format(CPU), fg=TextColors.p_head), spacer()], extra=2).write_log()
+		await next()
+	elif world.final:
+		await log(spacer(), save=False)
+		await TextBlock(texts=[Text('Ok, I removed myself from {0}\'s threat data store. I should get back to the cryopod now.'.format(CPU), fg=TextColors.p_head), spacer()], extra=2).write_log()
+		await next()
 	to_game()
 
 ## MARK: Timed events ##
-class QuickThread(threading.Thread):
-	def __init__(self):
-		self.over = False
-		self.__exit = threading.Event()
-		threading.Thread.__init__(self)
-
-	def run(self):
-		global oxy
-		while oxy > 0:
-			wait(1)
-			if self.__exit.is_set():
-				break
-			oxy -= 1
-			print_meters()
-		self.over = True
-
-	def stop(self):
-		self.__exit.set()
+async def quick_countdown():
+	while world.oxy > 0:
+		flush()
+		await clock.sleep(1)
+		world.oxy -= 1
+		print_meters()
 
-def fix_hull():
-	global oxy, inventory, quick_rooms
-	quick_rooms.remove(p_room)
+async def fix_hull():
+	world.quick_rooms.remove(world.p_room)
 	quick_block = TextBlock(extra=2)
-	quick_block.add_text(Text('[{0}]'.format(name), fg=TextColors.p_name))
+	quick_block.add_text(Text('[{0}]'.format(world.name), fg=TextColors.p_name))
 	quick_block.add_text(Text('There is a hole in the hull of the ship! I need to use my suit\'s emergency sealant before I run out of oxygen!', fg=TextColors.p_head))
 	quick_block.add_text(spacer())
-	quick_block.write_log()
-	log(Text('<Press enter to start the event>', styles=[TextStyles.faint]), save=False)
-	getch()
-	options_block = TextBlock(texts=[Text('1. Use suit sealant'), Text('2. Try to leave room before running out of oxygen')]).write_log()
-	thread = QuickThread()
-	thread.start()
+	await quick_block.write_log()
+	await log(Text('<Press enter to start the event>', styles=[TextStyles.faint]), save=False)
+	await getch(ENTER)
+	options_block = await TextBlock(texts=[Text('1. Use suit sealant'), Text('2. Try to leave room before running out of oxygen')]).write_log()
+	countdown = asyncio.create_task(quick_countdown())
+	key = None
 	fail = True
 	ch = ''
-	old_settings = termios.tcgetattr(sys.stdin)
 	try:
-			tty.setcbreak(sys.stdin.fileno())
-			while ch != '1' and ch != '2' and not thread.over:
-				if select.select([sys.stdin], [], [], 0) == ([sys.stdin], [], []):
-					ch = sys.stdin.read(1)
+		while ch != '1' and ch != '2' and not countdown.done():
+			key = asyncio.create_task(getch(('hull', ['1', '2'])))
+			await asyncio.wait([key, countdown], return_when=asyncio.FIRST_COMPLETED)
+			if key.done():
+				ch = key.result()
+			else:
+				key.cancel()
 	finally:
-		termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
-	thread.stop()
-	thread.join()
+		countdown.cancel()
+		if key:
+			key.cancel()
 	if ch == '1':
 		fail = False
-	if oxy != oxy_max:
-		oxy += 1
+	if world.oxy != world.oxy_max:
+		world.oxy += 1
 	print_meters()
 	if fail:
 		fail_block = TextBlock(extra=2)
@@ -445,27 +1320,96 @@ def fix_hull():
 		else:
 			fail_block.add_text(Text('Darn, I wasn\'t able to use the sealent in time.', fg=TextColors.p_head))
 		fail_block.add_text(Text('The suit\'s emergency oxygen system refilled a little of my O2.', fg=TextColors.p_head))
-		if inventory:
+		if world.inventory:
 			fail_block.extra = 4
-			lost_item = inventory.pop(random.randrange(len(inventory)))
+			lost_item = world.inventory.pop(rng.randrange(len(world.inventory)))
 			fail_block.add_text(Text('Sadly, it looks like my {0} flew out and stopped up the hole'.format(lost_item.name), fg=TextColors.p_head))
-			fail_block.write_log()
-			log(Text('<Removed {0} from inventory>'.format(lost_item.name), styles=[TextStyles.faint]), save=False)
-			log(spacer())
+			await fail_block.write_log()
+			await log(Text('<Removed {0} from inventory>'.format(lost_item.name), styles=[TextStyles.faint]), save=False)
+			await log(spacer())
 		else:
 			fail_block.add_text(Text('Luckily, it looks like a loose item in the room flew over and stopped up the hole.', fg=TextColors.p_head))
 			fail_block.add_text(spacer())
-			fail_block.write_log()
+			await fail_block.write_log()
 	else:
 		win_block = TextBlock(extra=2)
 		win_block.add_text(Text('The suit\'s emergency oxygen system refilled a little of my O2.', fg=TextColors.p_head))
 		win_block.add_text(Text('Looks like the seal worked!', fg=TextColors.p_head))
-		win_block.write_log()
-	next()
-	log(spacer())
+		await win_block.write_log()
+	await next()
+	await log(spacer())
+
+## MARK: Catalogue ##
+CATALOGUE_HEADER = re.compile(rb'^\[([^\]\n]+)\][ \t]*$', re.M)
+SPEAKER = re.compile(r'(\w+)> ')
+SPEAKERS = {
+	'player': ('[{name}]', TextColors.p_name, TextColors.p_head, False),
+	'cpu': ('[{cpu}]', TextColors.cpu_name, TextColors.cpu, True),
+	'alarm': ('[{cpu}]', TextColors.cpu_name, TextColors.danger, True)
+}
+
+class Catalogue:
+	def __init__(self, path):
+		with open(path, 'rb') as f:
+			self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		self.index = {}
+		self.entries = collections.OrderedDict()
+		headers = list(CATALOGUE_HEADER.finditer(self.buf))
+		for match, after in zip(headers, headers[1:] + [None]):
+			self.index[match.group(1).decode()] = (match.end(), after.start() if after else len(self.buf))
+
+	def entry(self, key):
+		if key in self.entries:
+			self.entries.move_to_end(key)
+			return self.entries[key]
+		start, end = self.index[key]
+		entry = {}
+		field = None
+		for line in self.buf[start:end].decode().split('\n'):
+			if line[:1] in [' ', '\t'] and field:
+				entry[field].append(line.strip())
+			elif line.strip() and not line.startswith('#'):
+				field, _, value = line.partition(':')
+				entry[field] = value.strip() or []
+		self.entries[key] = entry
+		if len(self.entries) > CATALOGUE_ENTRIES:
+			self.entries.popitem(last=False)
+		return entry
+
+	def room(self, kind):
+		return self.entry('room {0}'.format(kind))
+
+	def object(self, kind, name):
+		return self.entry('object {0} {1}'.format(kind, name))
+
+	def item(self, name):
+		return self.entry('item {0}'.format(name))
+
+CATALOGUE = Catalogue(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalogue.txt'))
+
+def dialogue(lines, extra=1, **fields):
+	block = TextBlock(extra=extra)
+	header = None
+	for line in lines:
+		if line == '-':
+			block.add_text(spacer())
+			continue
+		match = SPEAKER.match(line)
+		speaker = SPEAKERS.get(match.group(1)) if match else None
+		if speaker is None:
+			block.add_text(Text(line.format(name=world.name, cpu=CPU, **fields)))
+			header = None
+			continue
+		if speaker[0] != header:
+			header = speaker[0]
+			block.add_text(Text(header.format(name=world.name, cpu=CPU), fg=speaker[1]))
+		block.add_text(Text(line[match.end():].format(name=world.name, cpu=CPU, **fields), fg=speaker[2], slow=speaker[3]))
+	return block
 
 ## MARK: Items ##
 class Item():
+	__slots__ = ('use',)
+
 	def __init__(self, use=None):
 		self.use = self.__use_error
 		self.use = use if use else self.use
@@ -473,47 +1417,52 @@ class Item():
 	def __use_error():
 		raise NotImplementedError
 
+	@property
+	def info(self):
+		return CATALOGUE.item(self.name)['info']
+
 	def remove_item(self):
-		global inventory
-		for i, item in enumerate(inventory):
+		for i, item in enumerate(world.inventory):
 			if item.name == self.name:
-				del inventory[i]
+				del world.inventory[i]
 				break
 
 class EnergyPack(Item):
+	__slots__ = ()
 	name = 'energy pack'
-	info = 'restores 1 energy point'
 
 	def __init__(self):
 		super().__init__(use=self.use_energy_pack)
 
-	def use_energy_pack(self):
-		global eng
-		if eng == eng_max:
-			TextBlock(texts=[Text('Energy already full!'), spacer()]).write_log()
+	async def use_energy_pack(self):
+		if world.eng == world.eng_max:
+			await TextBlock(texts=[Text('Energy already full!'), spacer()]).write_log()
 		else:
-			eng += 1
+			world.eng += 1
 			self.remove_item()
 			print_meters()
 
 class OxygenPack(Item):
+	__slots__ = ()
 	name = 'oxygen pack'
-	info = 'fully restores oxygen'
 
 	def __init__(self):
 		super().__init__(use=self.use_oxygen_pack)
 
-	def use_oxygen_pack(self):
-		global oxy
-		if oxy == oxy_max:
-			TextBlock(texts=[Text('Oxygen already full!'), spacer()]).write_log()
+	async def use_oxygen_pack(self):
+		if world.oxy == world.oxy_max:
+			await TextBlock(texts=[Text('Oxygen already full!'), spacer()]).write_log()
 		else:
-			oxy = oxy_max
+			world.oxy = world.oxy_max
 			self.remove_item()
 			print_meters()
 
+ITEMS = {EnergyPack.name: EnergyPack, OxygenPack.name: OxygenPack}
+
 ## MARK: Rooms ##
 class RoomObj():
+	__slots__ = ('examine',)
+
 	def __init__(self, examine=None):
 		self.examine = self.__examine_error
 		self.examine = examine if examine else self.examine
@@ -522,645 +1471,383 @@ class RoomObj():
 		raise NotImplementedError
 
 class Room:
-	def __init__(self, new=True, fix_done=True, quick_done=True, objects=None):
-		self.new = new
-		self.fix_done = fix_done
-		self.quick_done = quick_done
-		self.objects = objects if objects else {}
-
-	def fix_event(self):
-		raise NotImplementedError
-
-	def quick_event(self):
-		raise NotImplementedError
-
-	def save(self):
-		raise NotImplementedError
-
-	def load(self):
-		raise NotImplementedError
-
-class R0(Room):
-	name='Bridge'
-	info='There is a single chair and a console at the front. To the left is a cryopod. To the right is a storage box. Behind is a door.'
-	color=TextColors.r0
-
-	def __init__(self, door_locked=True, box_looted=False):
-		super().__init__(
-			new=False,
-			objects={
-				'console': RoomObj(examine=self.examine_console),
-				'box': RoomObj(examine=self.examine_box),
-				'door': RoomObj(examine=self.examine_door),
-				'cryopod': RoomObj(examine=self.examine_cryopod)
-			}
-		)
-		self.door_locked=door_locked
-		self.box_looted=box_looted
-
-	def examine_console(self):
-		console_block = TextBlock()
-		console_block.add_text(Text('What would you like to do?'))
-		console_block.add_text(Text('a) Read mission history'))
-		console_block.add_text(Text('b) Unlock doors'))
-		console_block.add_text(Text('c) Close'))
-		console_block.write_log()
-		option = prompt(allowed=['a', 'b', 'c'], main=False)
-		if option == 'a':
-			mission_block = TextBlock()
-			mission_block.add_text(Text('Humans have successfully colonized the Solar System, expanding civilization to Mars, Venus, and Titan.'))
-			mission_block.add_text(Text('In an attempt to begin extra-solar colonization, the ship Explorer was launched with the goal of reaching the closest Earth-like planet, Proxima Centauri b, located 4.2 light years away.'))
-			mission_block.add_text(Text('With recent technological developments allowing for travel at 1/50th the speed of light, it could take only 207 years to reach the planet. However, due to the time it would take to fully accelerate and decelerate the engine, it would take 502 years at max speed.'))
-			mission_block.add_text(Text('Travelling at 1/100th the speed of light reduced the trip to only 422 years. In order to control the ship and ensure that the planet would be ready for the arrival of colonists later, and advanced AI was built to lead the mission.'))
-			mission_block.add_text(Text('It would be impossible to know how the AI, known as {0}, would act over the almost 500 years it would take to arrive at Proxima Centauri b and terraform the planet.'.format(CPU)))
-			mission_block.add_text(Text('Thus, Captain {0} was chosen to travel with {1} and fix any issues that might arise on the way.'.format(name, CPU)))
-			mission_block.add_text(Text('The successful completion of this mission will lay the foundation for human expansion accross the galaxy.'))
-			mission_block.add_text(spacer())
-			mission_block.write_log()
-		elif option == 'b':
-			if self.door_locked:
-				self.door_locked = False
-				TextBlock(texts=[Text('Doors unlocked')], extra=3).write_log()
-				log(Text('<You can now move through the ship>', styles=[TextStyles.faint]), save=False)
-				log(spacer())
-			else:
-				TextBlock(texts=[Text('Doors already unlocked.'), spacer()]).write_log()
-
-	def examine_box(self):
-		global inventory
-		if self.box_looted:
-			TextBlock(texts=[Text('The box is empty.'), spacer()]).write_log()
-		else:
-			self.box_looted = True
-			TextBlock(texts=[Text('There is a spare {0} inside the box.'.format(EnergyPack.name))], extra=3).write_log()
-			log(Text('<Added {0} to inventory>'.format(EnergyPack.name), styles=[TextStyles.faint]), save=False)
-			log(spacer())
-			inventory += [EnergyPack()]
-
-	def examine_door(self):
-		TextBlock(texts=[Text('The door appears to be locked.' if self.door_locked else 'The door is unlocked.'), spacer()]).write_log()
-
-	def examine_cryopod(self):
-		if final:
-			end(state=GameOverState.win)
-		else:
-			TextBlock(texts=[Text('The cryopod can\'t be opened till I fix all the ship\'s issues.'), spacer()]).write_log()
-
-	def save(self):
-		return ','.join([str(param) for param in [self.door_locked, self.box_looted]])
-
-	def load(self, data):
-		self.door_locked, self.box_looted = data
-
-class R1(Room):
-	name='Oxygen Tanks'
-	info='Large tanks filled with liquid oxygen stretch from floor to ceiling. There is a shelf in the corner with some portable o2 cells. A small terminal on the wall blinks periodically.'
-	color=TextColors.r1
-	fix_info='There is a hissing sound that can be heard throughout the room. One of the tank valves must have been opened! The terminal might allow me to debug the problem.'
-
-	def __init__(self, new=True, shelf_looted=False, fix_done=True, quick_done=True):
-		super().__init__(
-			new=new,
-			fix_done=fix_done,
-			quick_done=quick_done,
-			objects={'shelf': RoomObj(examine=self.examine_shelf), 'terminal': RoomObj(examine=self.examine_terminal)}
-		)
-		self.shelf_looted = shelf_looted
-
-	def examine_shelf(self):
-		global inventory
-		if self.shelf_looted:
-			TextBlock(texts=[Text('There is nothing on the shelf.'), spacer()]).write_log()
-		else:
-			self.shelf_looted = True
-			TextBlock(texts=[Text('There is an {0} inside the box.'.format(OxygenPack.name))], extra=3).write_log()
-			log(Text('<Added {0} to inventory>'.format(OxygenPack.name), styles=[TextStyles.faint]), save=False)
-			log(spacer())
-			inventory += [OxygenPack()]
-
-	def examine_terminal(self):
-		if self.fix_done:
-			TextBlock(texts=[Text('A message flashes showing that all systems are operational.'), spacer()]).write_log()
-		else:
-			log(spacer())
-			self.fix_event()
+	__slots__ = ('kind', 'new', 'fix_done', 'quick_done', 'flags', 'fields', 'objects')
 
-	def fix_event(self):
-		hack_cpu()
+	def __init__(self, kind):
+		entry = CATALOGUE.room(kind)
+		self.kind = kind
+		self.new = entry.get('new') != 'False'
 		self.fix_done = True
-		fix_block = TextBlock()
-		fix_block.add_text(Text('[{0}]'.format(name), fg=TextColors.p_name))
-		fix_block.add_text(Text('Great, I was able to access the valve control systems and stop the leak!', fg=TextColors.p_head))
-		fix_block.add_text(Text('I was also able to access my suit\'s systems and increase the energy capacity.', fg=TextColors.p_head))
-		fix_block.add_text(spacer())
-		fix_block.write_log()
-
-	def quick_event(self):
-		fix_hull()
-
-	def save(self):
-		return ','.join([str(param) for param in [self.new, self.shelf_looted, self.fix_done, self.quick_done]])
-
-	def load(self, data):
-		self.new, self.shelf_looted, self.fix_done, self.quick_done = data
-
-class R2(Room):
-	name='Terraforming Equipment'
-	info='Massive containers line the back wall filled with nutrient-rich soil, water, and seeds of various crops. The rest of the 1km long room is taken up by chemical synthesizing machines, which will produce the gasses necessary to start forming a breathable atmosphere on the planet.'
-	color=TextColors.r2
-	fix_info='The ground is covered in a thin layer of water. It looks like one of the containers had burst open!. I need to find a way to fix the problem. Maybe there is an object in the room I can use to interface with {0}...'.format(CPU)
-
-	def __init__(self, new=True, crate_looted=False, fix_done=True):
-		super().__init__(
-			new=new,
-			fix_done=fix_done,
-			objects={'monitor': RoomObj(examine=self.examine_monitor), 'crate': RoomObj(examine=self.examine_crate)}
-		)
-		self.crate_looted = crate_looted
-
-	def examine_monitor(self):
-		if self.fix_done:
-			TextBlock(texts=[Text('A table shows that all equipment is functional and ready for deployment.'), spacer()]).write_log()
-		else:
-			log(spacer())
-			self.fix_event()
-
-	def examine_crate(self):
-		global inventory
-		if self.crate_looted:
-			TextBlock(texts=[Text('[{0}]'.format(name), fg=TextColors.p_name), Text('I can\'t see anything else inside the crate.', fg=TextColors.p_head), spacer()]).write_log()
-		else:
-			self.crate_looted = True
-			TextBlock(texts=[Text('There is an {0} inside the crate.'.format(EnergyPack.name))], extra=3).write_log()
-			log(Text('<Added {0} to inventory>'.format(EnergyPack.name), styles=[TextStyles.faint]), save=False)
-			log(spacer())
-			inventory += [EnergyPack()]
-
-	def fix_event(self):
-		hack_cpu()
-		self.fix_done = True
-		fix_block = TextBlock()
-		fix_block.add_text(Text('[{0}]'.format(name), fg=TextColors.p_name))
-		fix_block.add_text(Text('Great, I was able to tell {0} to repair the container and vacuum up the water!'.format(CPU), fg=TextColors.p_head))
-		fix_block.add_text(Text('I was also able to access my suit\'s systems and increase the energy capacity.', fg=TextColors.p_head))
-		fix_block.add_text(spacer())
-		fix_block.write_log()
-
-	def save(self):
-		return ','.join([str(param) for param in [self.new, self.crate_looted, self.fix_done]])
-
-	def load(self, data):
-		self.new, self.crate_looted, self.fix_done = data
-
-class R3(Room):
-	name='Food Stores'
-	info='The room is filled floor to ceiling with hydroponic gardens growing potatoes, carrots, tomatoes, wheat, beans, and what appears to be almost every other fruit, vegetable, and grain. Below the glass floor, large freezers are being filled by robotic harvesters which must have been running most of the flight.'
-	color=TextColors.r3
-	fix_info='There are potatoes all over the floor. It looks like one of the hydroponic garden harveters is broken. Let me see what I can do to fix the issue.'
-
-	def __init__(self, new=True, trapdoor_looted=False, fix_done=True, quick_done=True):
-		super().__init__(
-			new=new,
-			fix_done=fix_done,
-			quick_done=quick_done,
-			objects={'console': RoomObj(examine=self.examine_console), 'trapdoor': RoomObj(examine=self.examine_trapdoor)}
-		)
-		self.trapdoor_looted = trapdoor_looted
-
-	def examine_console(self):
-		if self.fix_done:
-			TextBlock(texts=[Text('Looks like food production is proceeding normally.'), spacer()]).write_log()
-		else:
-			log(spacer())
-			self.fix_event()
-
-	def examine_trapdoor(self):
-		global inventory
-		if self.trapdoor_looted:
-			TextBlock(texts=[Text('[{0}]'.format(name), fg=TextColors.p_name), Text('The space is empty.', fg=TextColors.p_head), spacer()]).write_log()
-		else:
-			self.trapdoor_looted = True
-			TextBlock(texts=[Text('There is a space under a trapdoor in the floor. There is an {0} inside.'.format(OxygenPack.name))], extra=3).write_log()
-			log(Text('<Added {0} to inventory>'.format(OxygenPack.name), styles=[TextStyles.faint]), save=False)
-			log(spacer())
-			inventory += [OxygenPack()]
-
-	def fix_event(self):
-		hack_cpu()
-		self.fix_done = True
-		fix_block = TextBlock()
-		fix_block.add_text(Text('[{0}]'.format(name), fg=TextColors.p_name))
-		fix_block.add_text(Text('The havesting system should be fixed now.', fg=TextColors.p_head))
-		fix_block.add_text(Text('I was also able to access my suit\'s systems and increase the energy capacity.', fg=TextColors.p_head))
-		fix_block.add_text(spacer())
-		fix_block.write_log()
-
-	def quick_event(self):
-		fix_hull()
-
-	def save(self):
-		return ','.join([str(param) for param in [self.new, self.trapdoor_looted, self.fix_done, self.quick_done]])
-
-	def load(self, data):
-		self.new, self.trapdoor_looted, self.fix_done, self.quick_done = data
-
-class R4(Room):
-	name='Reactor'
-	info='One of the most impressive feats of human engineering at the time, the reactor was built to use incredibly strong magnetic fields to stabilize a small solar core, then harvest the energy of the miniature sun using an encompassing array of solar panels.'
-	color=TextColors.r4
-	fix_info='My suits built in Geiger counter indicates that some radiation is escaping! There must be an issue with the magnetic field generators. I need to fix this before the reactor fails!'
-
-	def __init__(self, new=True, fix_done=True, quick_done=True):
-		super().__init__(
-			new=new,
-			fix_done=fix_done,
-			quick_done=quick_done,
-			objects={'terminal': RoomObj(examine=self.examine_terminal)}
-		)
-
-	def examine_terminal(self):
-		if self.fix_done:
-			TextBlock(texts=[Text('The reactor seems to be operating at capacity.'), spacer()]).write_log()
-		else:
-			log(spacer())
-			self.fix_event()
-
-	def fix_event(self):
-		hack_cpu()
+		self.quick_done = True
+		self.flags = {}
+		self.fields = []
+		for field in entry['state'].split():
+			field, _, value = field.partition('=')
+			self.fields.append(field)
+			if field not in Room.__slots__:
+				self.flags[field] = value == 'True'
+		self.objects = {}
+		for name in entry['objects'].split(', '):
+			obj = CATALOGUE.object(kind, name)
+			self.objects[name] = RoomObj(examine=functools.partial(ACTIONS[obj['action']], self, obj))
+
+	def __getattr__(self, key):
+		flags = object.__getattribute__(self, 'flags')
+		if key in flags:
+			return flags[key]
+		raise AttributeError(key)
+
+	@property
+	def name(self):
+		return CATALOGUE.room(self.kind)['name']
+
+	@property
+	def info(self):
+		return CATALOGUE.room(self.kind)['info'].format(cpu=CPU)
+
+	@property
+	def color(self):
+		return TextColors[CATALOGUE.room(self.kind)['color']]
+
+	@property
+	def fix_info(self):
+		return CATALOGUE.room(self.kind)['fix_info'].format(cpu=CPU)
+
+	async def fix_event(self):
+		await hack_cpu()
 		self.fix_done = True
-		fix_block = TextBlock()
-		fix_block.add_text(Text('[{0}]'.format(name), fg=TextColors.p_name))
-		fix_block.add_text(Text('The reactor should be stable now. Good thing I stopped this before it failed.', fg=TextColors.p_head))
-		fix_block.add_text(Text('I was also able to access my suit\'s systems and increase the energy capacity.', fg=TextColors.p_head))
-		fix_block.add_text(spacer())
-		fix_block.write_log()
+		await dialogue(CATALOGUE.room(self.kind)['fixed']).write_log()
 
-	def quick_event(self):
-		fix_hull()
+	async def quick_event(self):
+		await fix_hull()
 
 	def save(self):
-		return ','.join([str(param) for param in [self.new, self.fix_done, self.quick_done]])
+		return ','.join([str(self.flags[field] if field in self.flags else getattr(self, field)) for field in self.fields])
 
 	def load(self, data):
-		self.new, self.fix_done, self.quick_done = data
-
-class R5(Room):
-	name='Mainframe'
-	info='The sheer scale of the computer was enough to make most stop in their tracks and gaze in awe. This was the heart of the ship\'s computer, {0}. Designed to handle flight operations and maintenance during the 422 year journey, plus the terraforming and preparation of Proxima Centauri b, {1} was the most advanced AI ever built by humans.'.format(CPU, CPU)
-	color=TextColors.r5
-
-	def __init__(self, new=True, fought=False):
-		super().__init__(
-			new=new,
-			objects={'primary console': RoomObj(examine=self.examine_primary_console)}
-		)
-		self.fought = fought
-
-	def examine_primary_console(self):
-		if self.fought:
-			galileo_block = TextBlock()
-			galileo_block.add_text(Text('[{0}]'.format(CPU), fg=TextColors.cpu_name))
-			galileo_block.add_text(Text('All systems operational. I recommend you re-enter the cryopod to await our arrival.', fg=TextColors.cpu, slow=True))
-			galileo_block.add_text(spacer())
-			galileo_block.write_log()
-		elif final:
-			hack_cpu()
-			self.fought = True
-		else:
-			galileo_block = TextBlock()
-			galileo_block.add_text(Text('[{0}]'.format(CPU), fg=TextColors.cpu_name))
-			galileo_block.add_text(Text('Access denied.', fg=TextColors.danger, slow=True))
-			galileo_block.add_text(spacer())
-			galileo_block.write_log()
-
-	def save(self):
-		return ','.join([str(param) for param in [self.new, self.fought]])
-
-	def load(self, data):
-		self.new, self.fought = data
-
-class R6(Room):
-	name='Escape Pod'
-	info='A small escape pod located in a hanger bay. With the ability to take off and land, it was more of an exploration vehicle than an escape pod. The interior contains little more than an area to store necessary supplies, a cryopod in case the ship is stranded, and a transmitter to allow rescuers to locate the ship.'
-	color=TextColors.r6
-	fix_info='What! The escape pod looks like it\'s preparing to launch. I need to stop it quickly!'
-
-	def __init__(self, new=True, pod_looted=False, fix_done=True, quick_done=True):
-		super().__init__(
-			new=new,
-			fix_done=fix_done,
-			quick_done=quick_done,
-			objects={'pod': RoomObj(examine=self.examine_pod), 'pod console': RoomObj(examine=self.examine_pod_console)}
-		)
-		self.pod_looted = pod_looted
-
-	def examine_pod(self):
-		global inventory
-		if self.pod_looted:
-			TextBlock(texts=[Text('[{0}]'.format(name), fg=TextColors.p_name), Text('There is nothing left in the pod emergency stores.', fg=TextColors.p_head), spacer()]).write_log()
-		else:
-			self.pod_looted = True
-			TextBlock(texts=[Text('The is a locker with some emergency stores with an {0}.'.format(EnergyPack.name))], extra=3).write_log()
-			log(Text('<Added {0} to inventory>'.format(EnergyPack.name), styles=[TextStyles.faint]), save=False)
-			log(spacer())
-			inventory += [EnergyPack()]
-
-	def examine_pod_console(self):
-		if self.fix_done:
-			pod_console_block = TextBlock()
-			pod_console_block.add_text(Text('What would you like to do?'))
-			pod_console_block.add_text(Text('a) Use escape pod'))
-			pod_console_block.add_text(Text('b) Close'))
-			pod_console_block.write_log()
-			option = prompt(allowed=['a', 'b'], main=False)
-			if option == 'a':
-				end(state=GameOverState.escape)
-		else:
-			log(spacer())
-			self.fix_event()
-
-	def fix_event(self):
-		hack_cpu()
-		self.fix_done = True
-		fix_block = TextBlock()
-		fix_block.add_text(Text('[{0}]'.format(name), fg=TextColors.p_name))
-		fix_block.add_text(Text('The pod launch sequence has stopped. I can always use this if I can\'t fix all the ship\' problems.', fg=TextColors.p_head))
-		fix_block.add_text(Text('I was also able to access my suit\'s systems and increase the energy capacity.', fg=TextColors.p_head))
-		fix_block.add_text(spacer())
-		fix_block.write_log()
-
-	def quick_event(self):
-		fix_hull()
-
-	def save(self):
-		return ','.join([str(param) for param in [self.new, self.pod_looted, self.fix_done, self.quick_done]])
-
-	def load(self, data):
-		self.new, self.pod_looted, self.fix_done, self.quick_done = data
-
-class R7(Room):
-	name='Engine'
-	info='Although this engine could push the ship up to speeds of 1/50 the speed of light, given the close proximity to the Alpha Centauri system, it would take slightly longer to reach the planet due to the long acceleration and deceleration needed.'
-	color=TextColors.r7
-	fix_info='Loud sounds can be heard periodically. There must be something wrong with the engine deceleration sequence. I need to run the debugging sequence so {0} can adjust the engine parameters.'.format(CPU)
-
-	def __init__(self, new=True, fix_done=True, quick_done=True):
-		super().__init__(
-			new=new,
-			fix_done=fix_done,
-			quick_done=quick_done,
-			objects={'console': RoomObj(examine=self.examine_console)}
-		)
-
-	def examine_console(self):
-		if self.fix_done:
-			TextBlock(texts=[Text('The engine is decelerating. We should reach the planet in just a little over 10 years.'), spacer()]).write_log()
-		else:
-			log(spacer())
-			self.fix_event()
-
-	def fix_event(self):
-		hack_cpu()
-		self.fix_done = True
-		fix_block = TextBlock()
-		fix_block.add_text(Text('[{0}]'.format(name), fg=TextColors.p_name))
-		fix_block.add_text(Text('All that can be heard is a low hum. The deceleration process should be fixed now.', fg=TextColors.p_head))
-		fix_block.add_text(Text('I was also able to access my suit\'s systems and increase the energy capacity.', fg=TextColors.p_head))
-		fix_block.add_text(spacer())
-		fix_block.write_log()
-
-	def quick_event(self):
-		fix_hull()
-
-	def save(self):
-		return ','.join([str(param) for param in [self.new, self.fix_done, self.quick_done]])
+		for field, value in zip(self.fields, data):
+			if field in self.flags:
+				self.flags[field] = value
+			else:
+				setattr(self, field, value)
 
-	def load(self, data):
-		self.new, self.fix_done, self.quick_done = data
-
-class R8(Room):
-	name='Shield Generator'
-	info='The size of a city block, the device converts energy to form small electric, magnetic, and gravitational fields around the ship. The shield generator provides a moderate amount of protection against strong solar winds, asteriods and other debris, and potentially any alien ships if such an encounter were to occur.'
-	color=TextColors.r8
-	fix_info='It seems like the electric field generator is down. I\'ll need to find a way to restore it or a solar flare from Alpha Centauri A could knock out the ships systems.'
-
-	def __init__(self, new=True, fix_done=True, quick_done=True):
-		super().__init__(
-			new=new,
-			fix_done=fix_done,
-			quick_done=quick_done,
-			objects={'monitor': RoomObj(examine=self.examine_monitor)}
-		)
-
-	def examine_monitor(self):
-		if self.fix_done:
-			TextBlock(texts=[Text('The electric, magnetic, and gravitational fields are all operating at full strengh.'), spacer()]).write_log()
+async def examine_loot(room, obj):
+	item = ITEMS[obj['item']]
+	if room.flags[obj['flag']]:
+		await dialogue(obj['empty']).write_log()
+	else:
+		room.flags[obj['flag']] = True
+		await dialogue(obj['found'], extra=3, item=item.name).write_log()
+		await log(Text('<Added {0} to inventory>'.format(item.name), styles=[TextStyles.faint]), save=False)
+		await log(spacer())
+		world.inventory += [item()]
+
+async def examine_fix(room, obj):
+	if room.fix_done:
+		await dialogue(obj['done']).write_log()
+	else:
+		await log(spacer())
+		await room.fix_event()
+
+async def examine_bridge_console(room, obj):
+	await dialogue(obj['menu']).write_log()
+	option = await prompt(allowed=['a', 'b', 'c'], main=False)
+	if option == 'a':
+		await dialogue(obj['history']).write_log()
+	elif option == 'b':
+		if room.door_locked:
+			room.flags['door_locked'] = False
+			await dialogue(obj['unlocked'], extra=3).write_log()
+			await log(Text('<{0}>'.format(obj['hint']), styles=[TextStyles.faint]), save=False)
+			await log(spacer())
 		else:
-			log(spacer())
-			self.fix_event()
+			await dialogue(obj['already']).write_log()
 
-	def fix_event(self):
-		hack_cpu()
-		self.fix_done = True
-		fix_block = TextBlock()
-		fix_block.add_text(Text('[{0}]'.format(name), fg=TextColors.p_name))
-		fix_block.add_text(Text('A loud crackle indicates that the electric field generator is up and running again.', fg=TextColors.p_head))
-		fix_block.add_text(Text('I was also able to access my suit\'s systems and increase the energy capacity.', fg=TextColors.p_head))
-		fix_block.add_text(spacer())
-		fix_block.write_log()
+async def examine_door(room, obj):
+	await dialogue(obj['locked' if room.door_locked else 'unlocked']).write_log()
 
-	def quick_event(self):
-		fix_hull()
+async def examine_cryopod(room, obj):
+	if world.final:
+		await end(state=GameOverState.win)
+	else:
+		await dialogue(obj['closed']).write_log()
+
+async def examine_mainframe(room, obj):
+	if room.fought:
+		await dialogue(obj['fought']).write_log()
+	elif world.final:
+		await hack_cpu()
+		room.flags['fought'] = True
+	else:
+		await dialogue(obj['denied']).write_log()
 
-	def save(self):
-		return ','.join([str(param) for param in [self.new, self.fix_done, self.quick_done]])
+async def examine_escape(room, obj):
+	if room.fix_done:
+		await dialogue(obj['menu']).write_log()
+		option = await prompt(allowed=['a', 'b'], main=False)
+		if option == 'a':
+			await end(state=GameOverState.escape)
+	else:
+		await log(spacer())
+		await room.fix_event()
 
-	def load(self, data):
-		self.new, self.fix_done, self.quick_done = data
+ACTIONS = {
+	'loot': examine_loot,
+	'fix': examine_fix,
+	'bridge console': examine_bridge_console,
+	'door': examine_door,
+	'cryopod': examine_cryopod,
+	'mainframe': examine_mainframe,
+	'escape': examine_escape
+}
 
-rooms = [R0(), R1(), R2(), R3(), R4(), R5(), R6(), R7(), R8()]
-for ri in fix_rooms:
-	rooms[ri].fix_done = False
-for ri in quick_rooms:
-	rooms[ri].quick_done = False
+new_game()
 
 ## MARK: Convenience logs ##
-def print_logs():
-	i = len(logs) - 1
+async def print_logs():
+	i = len(world.logs) - 1
 	while True:
-		log(Text('Entry [{0}/{1}] | Previous (a) | Next (d) | Quit (q)'.format(str(i + 1).rjust(len(str(len(logs)))), len(logs))), save=False, clear=True, validate=False)
-		log(Text(logs[i], end=False), save=False, validate=False)
-		ch = getch()
+		await log(Text('Entry [{0}/{1}] | Previous (a) | Next (d) | Quit (q)'.format(str(i + 1).rjust(len(str(len(world.logs)))), len(world.logs))), save=False, clear=True, validate=False)
+		for chunk in world.logs.chunks(i):
+			write(chunk)
+		write('\x1b[m')
+		ch = await getch(('log', ['a', 'd', 'q']))
 		while ch != 'q' and ch != 'a' and ch != 'd':
-			ch = getch()
+			ch = await getch(('log', ['a', 'd', 'q']))
 		if ch == 'q':
 			break
 		elif ch == 'a':
-			i = i - 1 if i > 0 else len(logs) - 1
+			i = i - 1 if i > 0 else len(world.logs) - 1
 		else:
-			i = i + 1 if i < len(logs) - 1 else 0
+			i = i + 1 if i < len(world.logs) - 1 else 0
 	to_game()
 
-def print_map():
-	log(Text('--Map-- ', end=False), save=False, clear=True, validate=False)
-	log(Text('(press enter to exit)', styles=[TextStyles.faint]), save=False, validate=False)
+async def print_map():
+	await log(Text('--Map-- ', end=False), save=False, clear=True, validate=False)
+	await log(Text('(press enter to exit)', styles=[TextStyles.faint]), save=False, validate=False)
 	map_block = TextBlock(save=False, validate=False)
-	for i, row in enumerate(SHIP):
-		for n, ri in enumerate(row):
-			r = (i + 1) * 3
-			c = LOG_COLS // 2 - 3 + 3 * n
+	ship = world.ship
+	height = max(1, min(ship.rows, (out.screen.rows - 3) // 3))
+	width = max(1, min(ship.cols, (out.screen.cols - MAP_LEGEND) // 3))
+	p_i, p_n = ship.locate(world.p_room)
+	top = min(max(p_i - height // 2, 0), ship.rows - height)
+	left = min(max(p_n - width // 2, 0), ship.cols - width)
+	start = max(MAP_LEGEND, out.screen.cols // 2 - 3 * (width // 2))
+	legend = []
+	for i in range(top, top + height):
+		for n in range(left, left + width):
+			ri = ship.cell(i, n)
+			r = (i - top + 1) * 3
+			c = start + 3 * (n - left)
 			if ri is None:
 				map_block.add_text(Text('   ', row=r, col=c))
 				map_block.add_text(Text('   ', row=r + 1, col=c))
 				map_block.add_text(Text('   ', row=r + 2, col=c))
 			else:
-				co = rooms[ri].color
-				h = ri == p_room
-				map_block.add_text(Text(rooms[ri].name, fg=co, row=3 + ri, end=False))
+				kind = ship.kind(ri)
+				co = TextColors[CATALOGUE.room(kind)['color']]
+				h = ri == world.p_room
+				if kind not in legend:
+					legend.append(kind)
+					map_block.add_text(Text(CATALOGUE.room(kind)['name'], fg=co, row=2 + len(legend), end=False))
 				map_block.add_text(Text('---', bg=co, row=r, col=c))
 				map_block.add_text(Text('|', bg=co, row=r + 1, col=c, end=False))
 				map_block.add_text(Text('*' if h else ' ', styles=[TextStyles.blink] if h else [], fg=TextColors.danger if h else None, bg=co, row=r + 1, col=c + 1, end=False))
 				map_block.add_text(Text('|', bg=co, row=r + 1, col=c + 2))
 				map_block.add_text(Text('---', bg=co, row=r + 2, col=c))
-	map_block.write_log()
-	getch()
+	await map_block.write_log()
+	await getch(ENTER)
 	to_game()
 
-def print_help():
-	log(Text('--List of commands-- ', end=False), save=False, clear=True, validate=False)
-	log(Text('(press enter to exit)', styles=[TextStyles.faint]), save=False, validate=False)
+async def print_help():
+	await log(Text('--List of commands-- ', end=False), save=False, clear=True, validate=False)
+	await log(Text('(press enter to exit)', styles=[TextStyles.faint]), save=False, validate=False)
 	for cmd, cmd_info in CMDS.items():
-		log(Text('{0}'.format(cmd), end=False), save=False, validate=False)
-		log(Text(' - {0}'.format(cmd_info)), save=False, validate=False)
-	getch()
+		await log(Text('{0}'.format(cmd), end=False), save=False, validate=False)
+		await log(Text(' - {0}'.format(cmd_info)), save=False, validate=False)
+	await log(Text('<Commands can be shortened and take their target on the same line, e.g. "ex box" or "use oxygen pack">', styles=[TextStyles.faint]), save=False, validate=False)
+	await getch(ENTER)
 	to_game()
 
 ## MARK: Logic ##
-def move(direction):
-	global p_room
-	if direction == 'down' and rooms[0].door_locked:
-		TextBlock(texts=[Text('The door appears to be locked'), spacer()]).write_log()
+AMBIGUOUS = object()
+
+class Trie:
+	__slots__ = ('root', 'words', 'args', 'bare')
+
+	def __init__(self, words=(), args=False):
+		self.root = {}
+		self.words = {}
+		self.args = args
+		self.bare = set()
+		for word in words:
+			self.add(word)
+
+	def add(self, word, value=None, prefix=True, args=True):
+		value = word if value is None else value
+		self.words[word] = value
+		if not args:
+			self.bare.add(value)
+		node = self.root
+		for ch in word:
+			node = node.setdefault(ch, {})
+			if prefix:
+				node[None] = value if node.get(None, value) == value else AMBIGUOUS
+		node[''] = value
+
+	def parse(self, text):
+		node = self.root
+		found = (None, text)
+		for i in range(len(text) + 1):
+			if i and (i == len(text) or text[i] == ' '):
+				value = node.get('', node.get(None))
+				if value is not None and value is not AMBIGUOUS:
+					found = (value, text[i:].strip())
+			if i == len(text) or text[i].lower() not in node:
+				break
+			node = node[text[i].lower()]
+		return found
+
+	def find(self, text):
+		value, rest = self.parse(text)
+		return None if rest else value
+
+	def __contains__(self, text):
+		value, rest = self.parse(text)
+		return value is not None and (not rest or (self.args and value not in self.bare))
+
+	def __iter__(self):
+		return (word for word, value in self.words.items() if word == value)
+
+@functools.lru_cache(maxsize=256)
+def choices(*words):
+	return Trie(words + ('nothing',))
+
+async def move(direction):
+	if direction == 'down' and world.rooms[0].door_locked:
+		await TextBlock(texts=[Text('The door appears to be locked'), spacer()]).write_log()
 	else:
-		p_loc = ()
-		moved = True
-		for i in range(len(SHIP)):
-			for n in range(len(SHIP[0])):
-				if SHIP[i][n] == p_room:
-					p_loc = (i, n)
-		if direction == 'up' and p_loc[0] != 0 and SHIP[p_loc[0] - 1][p_loc[1]] is not None:
-			p_room = SHIP[p_loc[0] - 1][p_loc[1]]
-		elif direction == 'down' and p_loc[0] != len(SHIP) - 1 and SHIP[p_loc[0] + 1][p_loc[1]]:
-			p_room = SHIP[p_loc[0] + 1][p_loc[1]]
-		elif direction == 'left' and p_loc[1] != 0 and SHIP[p_loc[0]][p_loc[1] - 1]:
-			p_room = SHIP[p_loc[0]][p_loc[1] - 1]
-		elif direction == 'right' and p_loc[1] != len(SHIP[0]) - 1 and SHIP[p_loc[0]][p_loc[1] + 1]:
-			p_room = SHIP[p_loc[0]][p_loc[1] + 1]
-		else:
-			moved = False
-		if moved and rooms[p_room].new:
-			if p_room in quick_rooms:
-				rooms[p_room].quick_event()
-			rooms[p_room].new = False
-			room_block = TextBlock(texts=[Text(rooms[p_room].name, styles=[TextStyles.bold]), Text(rooms[p_room].info), spacer()])
-			if p_room in fix_rooms:
-				room_block.add_text(Text(rooms[p_room].fix_info, fg=TextColors.danger)) 
+		moved = direction in world.ship.exits(world.p_room)
+		if moved:
+			world.p_room = world.ship.exits(world.p_room)[direction]
+		if moved and world.rooms[world.p_room].new:
+			if world.p_room in world.quick_rooms:
+				await world.rooms[world.p_room].quick_event()
+			world.rooms[world.p_room].new = False
+			room_block = TextBlock(texts=[Text(world.rooms[world.p_room].name, styles=[TextStyles.bold]), Text(world.rooms[world.p_room].info), spacer()])
+			if world.p_room in world.fix_rooms:
+				room_block.add_text(Text(world.rooms[world.p_room].fix_info, fg=TextColors.danger)) 
 				room_block.add_text(spacer())
-			room_block.write_log()
+			await room_block.write_log()
 		elif moved:
-			TextBlock(texts=[Text(rooms[p_room].name, styles=[TextStyles.bold]), spacer()]).write_log()
+			await TextBlock(texts=[Text(world.rooms[world.p_room].name, styles=[TextStyles.bold]), spacer()]).write_log()
 		else:
-			TextBlock(texts=[Text('There is no door that way'), spacer()]).write_log()
-
-def run_cmd(cmd):
-	if cmd == '?':
-		print_help()
-	elif cmd == 'log':
-		print_logs()
-	elif cmd == 'map':
-		print_map()
-	elif cmd == 'look':
-		look_block = TextBlock(texts=[Text(rooms[p_room].info), spacer()])
-		if p_room in fix_rooms:
-			if not rooms[p_room].fix_done:
-				look_block.add_text(Text(rooms[p_room].fix_info, fg=TextColors.danger))
-				look_block.add_text(spacer())
-		look_block.write_log()
-	elif cmd == 'examine':
+			await TextBlock(texts=[Text('There is no door that way'), spacer()]).write_log()
+
+async def look_room(arg=''):
+	look_block = TextBlock(texts=[Text(world.rooms[world.p_room].info), spacer()])
+	if world.p_room in world.fix_rooms:
+		if not world.rooms[world.p_room].fix_done:
+			look_block.add_text(Text(world.rooms[world.p_room].fix_info, fg=TextColors.danger))
+			look_block.add_text(spacer())
+	await look_block.write_log()
+
+async def examine_object(arg=''):
+	room = world.rooms[world.p_room]
+	objects = choices(*room.objects)
+	option = objects.find(arg) if arg else None
+	if option is None:
 		examine_block = TextBlock()
 		examine_block.add_text(Text('What would you like to examine?'))
-		for obj in rooms[p_room].objects.keys():
+		for obj in room.objects.keys():
 			examine_block.add_text(Text(obj))
 		examine_block.add_text(Text('nothing'))
-		examine_block.write_log()
-		option = prompt(allowed=list(rooms[p_room].objects.keys()) + ['nothing'], main=False)
-		if option != 'nothing':
-			rooms[p_room].objects[option].examine()
-	elif cmd == 'inventory':
-		inventory_block = TextBlock()
-		inventory_block.add_text(Text('Inventory items'))
-		for item in inventory:
-			inventory_block.add_text(Text(item.name, end=False))
-			inventory_block.add_text(Text(' - {0}'.format(item.info), styles=[TextStyles.faint]))
-		inventory_block.add_text(spacer())
-		inventory_block.write_log()
-	elif cmd == 'use':
+		await examine_block.write_log()
+		option = objects.find(await prompt(allowed=objects, main=False, topic='examine'))
+	if option != 'nothing':
+		await room.objects[option].examine()
+
+async def print_inventory(arg=''):
+	inventory_block = TextBlock()
+	inventory_block.add_text(Text('Inventory items'))
+	for item in world.inventory:
+		inventory_block.add_text(Text(item.name, end=False))
+		inventory_block.add_text(Text(' - {0}'.format(item.info), styles=[TextStyles.faint]))
+	inventory_block.add_text(spacer())
+	await inventory_block.write_log()
+
+async def use_item(arg=''):
+	items = choices(*dict.fromkeys(item.name for item in world.inventory))
+	option = items.find(arg) if arg else None
+	if option is None:
 		use_block = TextBlock()
 		use_block.add_text(Text('What would you like to use?'))
-		for item in inventory:
+		for item in world.inventory:
 			use_block.add_text(Text(item.name, end=False))
 			use_block.add_text(Text(' - {0}'.format(item.info), styles=[TextStyles.faint]))
 		use_block.add_text(Text('nothing'))
-		use_block.write_log()
-		option = prompt(allowed=[item.name for item in inventory] + ['nothing'], main=False)
-		if option != 'nothing':
-			for item in inventory:
-				if item.name == option:
-					item.use()
-					break
-	elif cmd in ['up', 'down', 'left', 'right']:
-		move(cmd)
-	elif cmd == 'save':
-		TextBlock(texts=[Text('Enter file name:')]).write_log()
-		f_name = prompt(blocked=[''], lower=False, main=False)
-		with open(f_name, 'w') as f:
-			f.write('--NAME--\n')
-			f.write('{0}\n'.format(name))
-			f.write('--OXY_MAX--\n')
-			f.write('{0}\n'.format(oxy_max))
-			f.write('--ENG_MAX--\n')
-			f.write('{0}\n'.format(eng_max))
-			f.write('--OXY--\n')
-			f.write('{0}\n'.format(oxy))
-			f.write('--ENG--\n')
-			f.write('{0}\n'.format(eng))
-			f.write('--ROOM--\n')
-			f.write('{0}\n'.format(p_room))
-			f.write('--FINAL--\n')
-			f.write('{0}\n'.format(final))
-			f.write('--INVENTORY--\n')
-			f.write('{0}\n'.format(','.join([item.name for item in inventory])))
-			f.write('--FIX_ROOMS--\n')
-			f.write('{0}\n'.format(','.join([str(room) for room in fix_rooms])))
-			f.write('--QUICK_ROOMS--\n')
-			f.write('{0}\n'.format(','.join([str(room) for room in quick_rooms])))
-			f.write('--ROOMS--\n')
-			[f.write('{0}\n'.format(room.save())) for room in rooms]
-			f.write('--LOGS--\n')
-			[f.write('{0}\n--\n'.format(log.rstrip())) for log in logs]
-	elif cmd == 'quit':
-		exit()
+		await use_block.write_log()
+		option = items.find(await prompt(allowed=items, main=False, topic='use'))
+	if option != 'nothing':
+		for item in world.inventory:
+			if item.name == option:
+				await item.use()
+				break
+
+async def save_file(arg=''):
+	f_name = arg
+	if not f_name:
+		await TextBlock(texts=[Text('Enter file name:')]).write_log()
+		f_name = await prompt(blocked=[''], lower=False, main=False, topic='file')
+	if save_dir:
+		folder = os.path.join(save_dir, session.get().name or 'local')
+		os.makedirs(folder, exist_ok=True)
+		f_name = os.path.join(folder, os.path.basename(f_name).lstrip('.') or 'save')
+	if not is_save(f_name):
+		await TextBlock(texts=[Text('{0} is not a save file, pick another name.'.format(os.path.basename(f_name)), fg=TextColors.danger)]).write_log()
+		return
+	save_game(f_name)
+	autosave(f_name)
+
+async def quit_game(arg=''):
+	raise GameOver()
+
+HANDLERS = {
+	'?': lambda arg: print_help(),
+	'log': lambda arg: print_logs(),
+	'map': lambda arg: print_map(),
+	'look': look_room,
+	'examine': examine_object,
+	'inventory': print_inventory,
+	'use': use_item,
+	'up': lambda arg: move('up'),
+	'down': lambda arg: move('down'),
+	'left': lambda arg: move('left'),
+	'right': lambda arg: move('right'),
+	'save': save_file,
+	'quit': quit_game
+}
+COMMANDS = Trie(args=True)
+for cmd in CMDS:
+	COMMANDS.add(cmd, prefix=cmd != 'quit', args=cmd != 'quit')
+for alias, cmd in ALIASES.items():
+	COMMANDS.add(alias, cmd)
+
+async def run_cmd(text):
+	cmd, arg = COMMANDS.parse(text)
+	await HANDLERS[cmd](arg)
 
 ## MARK: Intro ##
-def scan_cutscene():
-	for i in range(3, LOG_ROWS - 2):
-		log(Text('-' * LOG_COLS, fg=TextColors.danger, row=i, end=False), save=False, clear=True, validate=False)
-		wait(0.1)
-	for i in range(LOG_ROWS - 2, 3, -1):
-		log(Text('-' * LOG_COLS, fg=TextColors.danger, row=i, end=False), save=False, clear=True, validate=False)
-		wait(0.1)
+async def scan_cutscene():
+	for i in range(3, out.screen.rows - 2):
+		await log(Text('-' * out.screen.cols, fg=TextColors.danger, row=i, end=False), save=False, clear=True, validate=False)
+		await wait(0.1)
+	for i in range(out.screen.rows - 2, 3, -1):
+		await log(Text('-' * out.screen.cols, fg=TextColors.danger, row=i, end=False), save=False, clear=True, validate=False)
+		await wait(0.1)
 	to_game(show_meters=False)
 
-def title_screen():
+async def title_screen():
 	clear_log()
 	title_block = TextBlock(save=False, validate=False)
 	title_block.add_text(Text('CENTAURI', styles=[TextStyles.bold, TextStyles.underline], fg=TextColors.title, slow=True, delay=0.2, center=True, row=5))
@@ -1170,124 +1857,945 @@ def title_screen():
 	title_block.add_text(Text('Press enter to start', styles=[TextStyles.bold, TextStyles.blink], center=True, row=15))
 	title_block.add_text(Text('<Set background color to black and text color to white. Best played on 80x24.>', styles=[TextStyles.faint], center=True))
 	title_block.add_text(spacer())
-	title_block.write_log()
-	getch()
+	await title_block.write_log()
+	await getch(ENTER)
 
-def start_cutscene():
-	global name
+async def start_cutscene():
 	clear_log()
-	wait(3)
-	log(Text('W A R N I N G', styles=[TextStyles.bold, TextStyles.blink], fg=TextColors.danger, center=True, row=3), clear=True)
-	wait(3)
-	log(Text('[???]', fg=TextColors.cpu_name, row=6))
-	log(Text('Critical damage to {0} detected. Immediate action required.'.format(', '.join([rooms[ri].name for ri in fix_rooms])), styles=[TextStyles.bold], fg=TextColors.danger, slow=True))
-	log(spacer())
-	wait(1)
-	log(Text('Prematurely lifting cryosleep protocol', fg=TextColors.cpu, slow=True, end=False))
-	log(Text('...', fg=TextColors.cpu, slow=True, delay=1))
-	wait(1)
-	log(Text('Opening cryopod', fg=TextColors.cpu, slow=True, end=False))
-	log(Text('...', fg=TextColors.cpu, slow=True, delay=1))
-	log(spacer())
-	wait(1)
-	log(Text('Good morning, captain. Sorry for the early wake up, but there appears to be an issue with the ship.', fg=TextColors.cpu, slow=True))
-	log(spacer())
-	wait(1)
-	log(Text('[???]', fg=TextColors.p_name))
-	log(Text('Ugh. Wh~ what? My head is spinning...', fg=TextColors.p_head))
-	next()
-	log(Text('[{0}]'.format(CPU), fg=TextColors.cpu_name, row=3), clear=True)
-	log(Text('Your memory may be a bit foggy since I had to temporarily abort the cryosleep. I am the ship\'s computer, {0}.'.format(CPU), fg=TextColors.cpu, slow=True))
-	log(spacer())
-	wait(1)
-	log(Text('[???]', fg=TextColors.p_name))
-	log(Text('Hmm... I think that sounds familiar... What was my name again?', fg=TextColors.p_head))
-	name = prompt(blocked=[''], lower=False)
-	wait(1)
-	log(Text('Yes! My name is {0}.'.format(name), fg=TextColors.p_head))
-	log(spacer())
-	wait(1)
-	log(Text('[{0}]'.format(CPU), fg=TextColors.cpu_name))
-	log(Text('You seem to have more trouble remembering than was expected. This is worrying.', fg=TextColors.cpu, slow=True))
-	log(spacer())
-	wait(1)
-	log(Text('Running health scan', fg=TextColors.cpu, slow=True, end=False))
-	log(Text('...', fg=TextColors.cpu, slow=True, delay=1))
-	log(spacer())
-	scan_cutscene()
-	log(Text('Luckily you appear to be physically ok.', fg=TextColors.cpu, slow=True))
-	log(spacer())
-	wait(1)
-	log(Text('I recommend exploring the ship to refamiliarize yourself with the mission.', fg=TextColors.cpu, slow=True))
-	next()
-	log(Text('[{0}]'.format(CPU), fg=TextColors.cpu_name, row=3), clear=True)
+	await wait(3)
+	await log(Text('W A R N I N G', styles=[TextStyles.bold, TextStyles.blink], fg=TextColors.danger, center=True, row=3), clear=True)
+	await wait(3)
+	await log(Text('[???]', fg=TextColors.cpu_name, row=6))
+	await log(Text('Critical damage to {0} detected. Immediate action required.'.format(', '.join([world.rooms[ri].name for ri in world.fix_rooms])), styles=[TextStyles.bold], fg=TextColors.danger, slow=True))
+	await log(spacer())
+	await wait(1)
+	await log(Text('Prematurely lifting cryosleep protocol', fg=TextColors.cpu, slow=True, end=False))
+	await log(Text('...', fg=TextColors.cpu, slow=True, delay=1))
+	await wait(1)
+	await log(Text('Opening cryopod', fg=TextColors.cpu, slow=True, end=False))
+	await log(Text('...', fg=TextColors.cpu, slow=True, delay=1))
+	await log(spacer())
+	await wait(1)
+	await log(Text('Good morning, captain. Sorry for the early wake up, but there appears to be an issue with the ship.', fg=TextColors.cpu, slow=True))
+	await log(spacer())
+	await wait(1)
+	await log(Text('[???]', fg=TextColors.p_name))
+	await log(Text('Ugh. Wh~ what? My head is spinning...', fg=TextColors.p_head))
+	await next()
+	await log(Text('[{0}]'.format(CPU), fg=TextColors.cpu_name, row=3), clear=True)
+	await log(Text('Your memory may be a bit foggy since I had to temporarily abort the cryosleep. I am the ship\'s computer, {0}.'.format(CPU), fg=TextColors.cpu, slow=True))
+	await log(spacer())
+	await wait(1)
+	await log(Text('[???]', fg=TextColors.p_name))
+	await log(Text('Hmm... I think that sounds familiar... What was my name again?', fg=TextColors.p_head))
+	world.name = await prompt(blocked=[''], lower=False, topic='name')
+	await wait(1)
+	await log(Text('Yes! My name is {0}.'.format(world.name), fg=TextColors.p_head))
+	await log(spacer())
+	await wait(1)
+	await log(Text('[{0}]'.format(CPU), fg=TextColors.cpu_name))
+	await log(Text('You seem to have more trouble remembering than was expected. This is worrying.', fg=TextColors.cpu, slow=True))
+	await log(spacer())
+	await wait(1)
+	await log(Text('Running health scan', fg=TextColors.cpu, slow=True, end=False))
+	await log(Text('...', fg=TextColors.cpu, slow=True, delay=1))
+	await log(spacer())
+	await scan_cutscene()
+	await log(Text('Luckily you appear to be physically ok.', fg=TextColors.cpu, slow=True))
+	await log(spacer())
+	await wait(1)
+	await log(Text('I recommend exploring the ship to refamiliarize yourself with the mission.', fg=TextColors.cpu, slow=True))
+	await next()
+	await log(Text('[{0}]'.format(CPU), fg=TextColors.cpu_name, row=3), clear=True)
 	print_meters()
-	log(Text('You might want to press the help button on your suit to see what actions you can perform.', fg=TextColors.cpu, slow=True))
-	log(Text('<Press \'?\' to see the list of actions>', styles=[TextStyles.faint]), save=False)
-	cmd = prompt(allowed=['?'])
-	run_cmd(cmd)
+	await log(Text('You might want to press the help button on your suit to see what actions you can perform.', fg=TextColors.cpu, slow=True))
+	await log(Text('<Press \'?\' to see the list of actions>', styles=[TextStyles.faint]), save=False)
+	cmd = await prompt(allowed=['?'], topic='command')
+	await run_cmd(cmd)
+
+## MARK: Save files ##
+SAVE_HEADER = struct.Struct('<4sHH')
+SAVE_SECTION = struct.Struct('<4sII')
+LOG_ENTRY = struct.Struct('<II')
+
+def game_state():
+	return {
+		'ship': world.ship.spec,
+		'name': world.name,
+		'oxy_max': world.oxy_max,
+		'eng_max': world.eng_max,
+		'oxy': world.oxy,
+		'eng': world.eng,
+		'room': world.p_room,
+		'final': world.final,
+		'inventory': [item.name for item in world.inventory],
+		'fix_rooms': list(world.fix_rooms),
+		'quick_rooms': list(world.quick_rooms),
+		'rooms': {str(ri): data for ri, data in world.rooms.save().items()}
+	}
+
+def load_items(names):
+	for name in names:
+		if name not in ITEMS:
+			raise ValueError('unknown item {0!r} in save file'.format(name))
+	return [ITEMS[name]() for name in names]
+
+def set_game_state(state):
+	for key, value in state.items():
+		if key == 'ship':
+			world.ship = ProceduralShip(*value) if value else SHIP_GRAPH
+			world.rooms = Rooms(world)
+		elif key == 'room':
+			world.p_room = value
+		elif key == 'inventory':
+			world.inventory = load_items(value)
+		elif key == 'rooms':
+			for ri, data in (enumerate(value) if isinstance(value, list) else value.items()):
+				world.rooms.load(int(ri), data)
+		else:
+			setattr(world, key, value)
+
+def save_game(f_name):
+	state = json.dumps(game_state(), separators=(',', ':')).encode()
+	logs = world.logs
+	entries = [logs.raw(i) for i in range(len(logs))]
+	head = SAVE_HEADER.size + 3 * SAVE_SECTION.size
+	logs_at = head + len(state)
+	index_at = logs_at + sum(len(entry) for entry in entries)
+	index = bytearray()
+	offset = logs_at
+	for entry in entries:
+		index += LOG_ENTRY.pack(offset, len(entry))
+		offset += len(entry)
+	with open(f_name + '.tmp', 'wb') as f:
+		f.write(SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, 3))
+		f.write(SAVE_SECTION.pack(b'STAT', head, len(state)))
+		f.write(SAVE_SECTION.pack(b'LOGS', logs_at, index_at - logs_at))
+		f.write(SAVE_SECTION.pack(b'LIDX', index_at, len(index)))
+		f.write(state)
+		f.writelines(entries)
+		f.write(index)
+	os.replace(f_name + '.tmp', f_name)
+
+def is_save(f_name):
+	if not os.path.lexists(f_name):
+		return True
+	if os.path.islink(f_name) or not os.path.isfile(f_name):
+		return False
+	with open(f_name, 'rb') as f:
+		head = f.read(len(LEGACY_MAGIC))
+	return head.startswith(SAVE_MAGIC) or head == LEGACY_MAGIC
+
+def load_game(f_name):
+	with open(f_name, 'rb') as f:
+		buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+	if buf[:len(SAVE_MAGIC)] != SAVE_MAGIC:
+		load_legacy(buf[:].decode().split('\n'))
+		return
+	magic, version, count = SAVE_HEADER.unpack_from(buf)
+	if version > SAVE_VERSION:
+		raise ValueError('{0} was saved by a newer version of the game'.format(f_name))
+	sections = {}
+	for n in range(count):
+		tag, offset, size = SAVE_SECTION.unpack_from(buf, SAVE_HEADER.size + n * SAVE_SECTION.size)
+		sections[tag] = (offset, size)
+	offset, size = sections[b'STAT']
+	set_game_state(json.loads(buf[offset:offset + size]))
+	offset, size = sections[b'LIDX']
+	world.logs = LogBook(buf, offset, size // LOG_ENTRY.size, version, world.logs.max_pages)
+
+def load_legacy(lines):
+	lines = [line.rstrip() for line in lines]
+	i = 0
+	while i < len(lines):
+		if lines[i] == '--NAME--':
+			world.name = lines[i + 1]
+		elif lines[i] == '--OXY_MAX--':
+			world.oxy_max = int(lines[i + 1])
+		elif lines[i] == '--ENG_MAX--':
+			world.eng_max = int(lines[i + 1])
+		elif lines[i] == '--OXY--':
+			world.oxy = int(lines[i + 1])
+		elif lines[i] == '--ENG--':
+			world.eng = int(lines[i + 1])
+		elif lines[i] == '--ROOM--':
+			world.p_room = int(lines[i + 1])
+		elif lines[i] == '--FINAL--':
+			world.final = lines[i + 1] == 'True'
+		elif lines[i] == '--INVENTORY--':
+			world.inventory += load_items([item_name for item_name in lines[i + 1].split(',') if item_name])
+		elif lines[i] == '--FIX_ROOMS--':
+			world.fix_rooms = [int(room) for room in lines[i + 1].split(',')]
+		elif lines[i] == '--QUICK_ROOMS--':
+			world.quick_rooms = [int(room) for room in lines[i + 1].split(',')]
+		elif lines[i] == '--ROOMS--':
+			for n in range(len(SHIP_GRAPH.coords)):
+				i += 1
+				world.rooms.load(n, lines[i])
+		elif lines[i] == '--LOGS--':
+			i += 1
+			world.logs = LogBook(max_pages=world.logs.max_pages)
+			entry = []
+			while i < len(lines):
+				if lines[i] == '--':
+					world.logs.append(''.join(entry))
+					entry = []
+				else:
+					entry.append(lines[i] + '\n')
+				i += 1
+		i += 1
+
+class Journal:
+	def __init__(self, f_name):
+		self.f_name = f_name
+		self.path = f_name + '.journal'
+		self.f = None
+		self.size = 0
+		self.mark = {}
+		self.base = world.logs.first
+		self.logs = (0, 0)
+
+	def replay(self):
+		if not os.path.exists(self.path):
+			return
+		with open(self.path, 'r') as f:
+			for line in f:
+				try:
+					delta = json.loads(line)
+				except ValueError:
+					break
+				for n, start, spans in delta.pop('logs', []):
+					i = n + self.base - world.logs.first
+					spans = load_spans(json.dumps(spans))
+					if i == len(world.logs) and not start:
+						world.logs.append(spans.pop(0))
+					elif i != len(world.logs) - 1 or len(world.logs.spans(i)) != start:
+						continue
+					for span in spans:
+						world.logs.write(span)
+				set_game_state(delta)
+
+	def start(self, truncate=False):
+		self.f = open(self.path, 'w' if truncate else 'a')
+		self.size = self.f.tell()
+		self.mark = game_state()
+		if truncate:
+			self.base = world.logs.first
+		self.logs = (world.logs.first - self.base + len(world.logs), len(world.logs.spans(-1)) if world.logs else 0)
+
+	def sync(self):
+		state = game_state()
+		delta = {key: value for key, value in state.items() if self.mark.get(key) != value}
+		if 'rooms' in delta:
+			rooms = self.mark.get('rooms', {})
+			delta['rooms'] = {ri: data for ri, data in delta['rooms'].items() if rooms.get(ri) != data}
+		count, length = self.logs
+		shift = world.logs.first - self.base
+		total = shift + len(world.logs)
+		logs = []
+		if count > shift and len(world.logs.spans(count - 1 - shift)) > length:
+			logs.append([count - 1, length, world.logs.spans(count - 1 - shift)[length:]])
+		for n in range(max(count, shift), total):
+			logs.append([n, 0, world.logs.spans(n - shift)])
+		if logs:
+			delta['logs'] = logs
+			self.logs = (total, len(world.logs.spans(-1)))
+		if not delta:
+			return
+		self.mark = state
+		line = json.dumps(delta, separators=(',', ':')) + '\n'
+		self.f.write(line)
+		self.f.flush()
+		self.size += len(line)
+		if self.size > JOURNAL_MAX:
+			self.compact()
+
+	def compact(self):
+		save_game(self.f_name)
+		self.f.close()
+		self.start(truncate=True)
+
+	def close(self):
+		if self.f:
+			self.f.close()
+			self.f = None
+
+def autosave(f_name, resume=False):
+	if journal:
+		journal.close()
+	session.get().journal = Journal(f_name)
+	if resume:
+		journal.replay()
+	journal.start(truncate=not resume)
 
 ## MARK: Game loop ##
-def game_start():
+async def game_start():
 	while True:
-		cmd = prompt(allowed=CMDS.keys())
-		run_cmd(cmd)
-
-def init():
-	global name, oxy_max, eng_max, oxy, eng, p_room, final, inventory, fix_rooms, quick_rooms, logs
-	if len(sys.argv) > 2:
-		log(Text('Either run python3 game.py or python3 game.py <savefile>'), save=False, validate=False)
-		exit()
+		cmd = await prompt(allowed=COMMANDS, lower=False, topic='command')
+		await run_cmd(cmd)
+
+async def init():
+	ship = None
+	if len(sys.argv) == 3 and sys.argv[1] == '--ship':
+		try:
+			ship = parse_ship(sys.argv[2])
+		except ValueError:
+			pass
+	if (len(sys.argv) > 2 and not ship) or sys.argv[1:] == ['--ship']:
+		await log(Text(wrap_text(usage(), out.screen.cols)[0]), save=False, validate=False)
+		raise GameOver()
+	elif ship:
+		new_game(ship)
+		await title_screen()
+		await start_cutscene()
+		await game_start()
 	elif len(sys.argv) > 1:
-		with open(sys.argv[1], 'r') as f:
-			lines = f.readlines()
-			lines = [line.rstrip() for line in lines]
-			i = 0
-			while i < len(lines):
-				if lines[i] == '--NAME--':
-					name = lines[i + 1]
-				elif lines[i] == '--OXY_MAX--':
-					oxy_max = int(lines[i + 1])
-				elif lines[i] == '--ENG_MAX--':
-					eng_max = int(lines[i + 1])
-				elif lines[i] == '--OXY--':
-					oxy = int(lines[i + 1])
-				elif lines[i] == '--ENG--':
-					eng = int(lines[i + 1])
-				elif lines[i] == '--ROOM--':
-					p_room = int(lines[i + 1])
-				elif lines[i] == '--FINAL--':
-					final = lines[i + 1] == 'True'
-				elif lines[i] == '--INVENTORY--':
-					for item_name in lines[i + 1].split(','):
-						if item_name == EnergyPack.name:
-							inventory += [EnergyPack()]
-						elif item_name == OxygenPack.name:
-							inventory += [OxygenPack()]
-				elif lines[i] == '--FIX_ROOMS--':
-					fix_rooms = [int(room) for room in lines[i + 1].split(',')]
-				elif lines[i] == '--QUICK_ROOMS--':
-					quick_rooms = [int(room) for room in lines[i + 1].split(',')]
-				elif lines[i] == '--ROOMS--':
-					for n in range(len(rooms)):
-						i += 1
-						rooms[n].load([param == 'True' for param in lines[i].split(',')])
-				elif lines[i] == '--LOGS--':
-					i += 1
-					logs = ['']
-					while i < len(lines):
-						if lines[i] == '--':
-							logs.append('')
-						else:
-							logs[-1] += lines[i] + '\n'
-						i += 1
-					del logs[-1]
-				i += 1
+		load_game(sys.argv[1])
+		autosave(sys.argv[1], resume=True)
 		to_game()
-		game_start()
+		await game_start()
+	else:
+		await title_screen()
+		await start_cutscene()
+		await game_start()
+
+## MARK: Headless ##
+class ScriptedInput:
+	def __init__(self, keys):
+		self.keys = collections.deque(keys)
+
+	def start(self):
+		pass
+
+	def stop(self):
+		pass
+
+	async def get(self, ask=None):
+		if not self.keys:
+			raise EOFError
+		return self.keys.popleft()
+
+	async def query_pos(self):
+		return [1, 1]
+
+class NullWriter(FrameWriter):
+	def __init__(self):
+		super().__init__(None, grid=False)
+		self.screen.row = self.screen.col = 1
+		self.screen.pen = PLAIN
+
+	def emit(self, s):
+		pass
+
+	def write(self, s):
+		self.screen.track(s)
+
+	def present(self, rows):
+		pass
+
+	def flush(self):
+		pass
+
+async def play():
+	try:
+		await title_screen()
+		await start_cutscene()
+		await game_start()
+	except GameOver as over:
+		return over.state
+	except EOFError:
+		return None
+
+def run_headless(keys, seed=None, reader=None, ship=None):
+	session.get().rng.seed(seed)
+	use(reader=reader or ScriptedInput(keys), writer=NullWriter(), timer=NullClock())
+	new_game(ship)
+	return asyncio.run(play())
+
+## MARK: Recording ##
+REC_MAGIC = b'CREC'
+REC_VERSION = 3
+REC_HEADER = struct.Struct('<4sHHH')
+REC_SEED = struct.Struct('<Q')
+REC_SEGMENT = struct.Struct('<III')
+REC_EVENT = struct.Struct('<IcI')
+REC_SIZE = struct.Struct('<HH')
+REC_KEYFRAME = 5.0
+REC_SEGMENT_MAX = 1 << 18
+
+class Recorder:
+	def __init__(self, f_name, writer, seed):
+		self.f = open(f_name, 'wb')
+		self.writer = writer
+		self.origin = time.perf_counter()
+		self.segment = bytearray()
+		self.start = self.last = 0
+		self.f.write(REC_HEADER.pack(REC_MAGIC, REC_VERSION, writer.screen.cols, writer.screen.rows))
+		self.f.write(REC_SEED.pack(seed))
+		self.keyframe()
+
+	def event(self, kind, payload):
+		self.last = int((time.perf_counter() - self.origin) * 1000)
+		self.segment += REC_EVENT.pack(self.last, kind, len(payload))
+		self.segment += payload
+
+	def keyframe(self):
+		self.event(b'k', self.writer.screen.dump().encode())
+		self.start = self.last
+
+	def output(self, data):
+		self.event(b'o', data)
+		if self.last - self.start >= REC_KEYFRAME * 1000 or len(self.segment) >= REC_SEGMENT_MAX:
+			self.cut()
+			self.keyframe()
+
+	def input(self, data):
+		self.event(b'i', data)
+
+	def answer(self, key):
+		self.event(b'a', key.encode())
+
+	def resize(self, cols, rows):
+		self.event(b'r', REC_SIZE.pack(cols, rows))
+
+	def cut(self):
+		data = zlib.compress(self.segment)
+		self.f.write(REC_SEGMENT.pack(self.start, self.last, len(data)))
+		self.f.write(data)
+		self.f.flush()
+		self.segment = bytearray()
+
+	def close(self):
+		self.writer.recorder = None
+		self.cut()
+		self.f.close()
+
+class Recording:
+	def __init__(self, f_name):
+		with open(f_name, 'rb') as f:
+			self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, self.version, self.cols, self.rows = REC_HEADER.unpack_from(self.buf)
+		version = self.version
+		if magic != REC_MAGIC:
+			raise ValueError('{0} is not a recording'.format(f_name))
+		if version > REC_VERSION:
+			raise ValueError('{0} was recorded by a newer version of the game'.format(f_name))
+		self.seed = REC_SEED.unpack_from(self.buf, REC_HEADER.size)[0] if version >= 2 else None
+		self.segments = []
+		offset = REC_HEADER.size + (REC_SEED.size if version >= 2 else 0)
+		while offset + REC_SEGMENT.size <= len(self.buf):
+			start, end, size = REC_SEGMENT.unpack_from(self.buf, offset)
+			offset += REC_SEGMENT.size
+			if offset + size > len(self.buf):
+				break
+			self.segments.append((start, end, offset, size))
+			offset += size
+		self.starts = [segment[0] for segment in self.segments]
+
+	def duration(self):
+		return self.segments[-1][1] / 1000 if self.segments else 0
+
+	def seek(self, s):
+		return max(bisect.bisect_right(self.starts, int(s * 1000)) - 1, 0)
+
+	def events(self, first=0):
+		for start, end, offset, size in self.segments[first:]:
+			data = zlib.decompress(self.buf[offset:offset + size])
+			i = 0
+			while i < len(data):
+				at, kind, size = REC_EVENT.unpack_from(data, i)
+				i += REC_EVENT.size
+				yield at, kind, data[i:i + size]
+				i += size
+
+	def keys(self):
+		answers = b'i' if self.version == 1 else b'a'
+		return [payload.decode() for at, kind, payload in self.events() if kind == answers]
+
+	def input(self):
+		return {
+			'seed': self.seed,
+			'cols': self.cols,
+			'rows': self.rows,
+			'keys': self.keys(),
+			'raw': [[at, payload.decode('latin-1')] for at, kind, payload in self.events() if kind == b'i' and self.version >= 3]
+		}
+
+def replay(f_name, speed=1.0, seek=0.0, f=None):
+	f = f or sys.stdout.buffer
+	recording = Recording(f_name)
+	first = recording.seek(seek)
+	last = int(seek * 1000)
+	frame = bytearray()
+	shown = False
+	for at, kind, payload in recording.events(first):
+		if kind not in [b'k', b'o'] or (kind == b'k' and shown):
+			continue
+		shown = True
+		if at > last:
+			if speed:
+				f.write(frame)
+				f.flush()
+				frame = bytearray()
+				time.sleep((at - last) / 1000 / speed)
+			last = at
+		frame += payload
+	f.write(frame + b'\x1b[m\n')
+	f.flush()
+
+def replay_parser():
+	parser = argparse.ArgumentParser(prog='python3 game.py --replay', description='Play back a session recording')
+	parser.add_argument('recording')
+	parser.add_argument('--speed', type=float, default=1.0, help='playback speed, 0 jumps straight to the end')
+	parser.add_argument('--seek', type=float, default=0.0, help='seconds into the recording to start from')
+	parser.add_argument('--keys', action='store_true', help='print the RNG seed, the keys the game read and the raw timed input bytes as JSON instead of playing them back')
+	return parser
+
+def replay_main(argv):
+	args = replay_parser().parse_args(argv)
+	if args.keys:
+		print(json.dumps(Recording(args.recording).input()))
+		return
+	try:
+		replay(args.recording, args.speed, args.seek)
+	except KeyboardInterrupt:
+		sys.stdout.buffer.write(b'\x1b[m\n')
+
+## MARK: Spectators ##
+SPECTATE_BUFFER = 1 << 16
+
+class Viewer(asyncio.Protocol):
+	def __init__(self, broadcast):
+		self.broadcast = broadcast
+		self.transport = None
+		self.paused = False
+
+	def connection_made(self, transport):
+		self.transport = transport
+		transport.set_write_buffer_limits(SPECTATE_BUFFER)
+		self.broadcast.writer.flush()
+		transport.write(self.broadcast.resync())
+		self.broadcast.viewers.add(self)
+
+	def connection_lost(self, exc):
+		self.broadcast.viewers.discard(self)
+
+	def pause_writing(self):
+		self.paused = True
+
+	def resume_writing(self):
+		self.paused = False
+		self.transport.write(self.broadcast.resync())
+
+class Broadcast:
+	def __init__(self, writer, path):
+		self.writer = writer
+		self.path = path
+		self.server = None
+		self.viewers = set()
+		self.frames = 0
+		self.skipped = 0
+		self.snapshot = (None, b'')
+
+	async def start(self):
+		self.server = await asyncio.get_running_loop().create_unix_server(lambda: Viewer(self), self.path)
+
+	def output(self, data):
+		self.frames += 1
+		for viewer in self.viewers:
+			if viewer.paused:
+				self.skipped += 1
+			else:
+				viewer.transport.write(data)
+
+	def resync(self):
+		if self.snapshot[0] != self.frames:
+			self.snapshot = (self.frames, self.writer.screen.dump().encode())
+		return self.snapshot[1]
+
+	def close(self):
+		self.writer.broadcast = None
+		if self.server:
+			self.server.close()
+			os.unlink(self.path)
+		for viewer in list(self.viewers):
+			viewer.transport.close()
+
+async def watch(path):
+	reader, writer = await asyncio.open_unix_connection(path)
+	try:
+		while True:
+			data = await reader.read(SPECTATE_BUFFER)
+			if not data:
+				break
+			sys.stdout.buffer.write(data)
+			sys.stdout.buffer.flush()
+	finally:
+		writer.close()
+		sys.stdout.buffer.write(b'\x1b[m\n')
+		sys.stdout.buffer.flush()
+
+## MARK: Server ##
+IAC, SE, SB, WILL, WONT, DO, DONT = 255, 240, 250, 251, 252, 253, 254
+ECHO, SGA, NAWS = 1, 3, 31
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 2323
+NEGOTIATE_TIMEOUT = 0.5
+MIN_COLS, MIN_ROWS = 20, 10
+SUBNEG_MAX = 1 << 10
+POOL_SIZE = 64
+POOL_REFILL = 256
+POOL_TICK = 0.05
+SAVE_DIR = 'saves'
+
+class SocketInput(Keyboard):
+	def __init__(self, transport):
+		super().__init__(None)
+		self.transport = transport
+		self.closed = False
+		self.carriage = False
+
+	def start(self):
+		pass
+
+	def stop(self):
+		pass
+
+	async def get(self, ask=None):
+		if not self.closed:
+			key = await super().get(ask)
+			if key is not None:
+				return key
+			self.closed = True
+		raise EOFError
+
+	def feed(self, text):
+		if self.carriage and text[:1] in ['\n', '\0']:
+			text = text[1:]
+		self.carriage = text.endswith('\r')
+		super().feed(text.replace('\r\n', '\n').replace('\r\0', '\n').replace('\r', '\n'))
+
+	def close(self):
+		self.keys.put_nowait(None)
+		if self.position and not self.position.done():
+			self.position.set_exception(EOFError())
+
+	async def query_pos(self):
+		self.position = asyncio.get_running_loop().create_future()
+		flush()
+		self.transport.write(b'\x1b[6n')
+		return await self.position
+
+class SocketWriter(FrameWriter):
+	def __init__(self, transport):
+		super().__init__(None)
+		self.transport = transport
+		self.screen.resize(24, 80)
+		self.back.resize(24, 80)
+
+	def flush(self):
+		self.place()
+		if not self.frame:
+			return
+		data = ''.join(self.frame).replace('\n', '\r\n').encode()
+		self.frame = []
+		self.publish(data)
+		if not self.transport.is_closing():
+			self.transport.write(data)
+			self.writes += 1
+			self.bytes += len(data)
+
+class TelnetSession(asyncio.Protocol):
+	def connection_made(self, transport):
+		self.transport = transport
+		self.pending = b''
+		self.discard = False
+		self.session = pool.take(transport)
+		self.session.name = '{0}-{1}-{2}'.format(time.strftime('%Y%m%d-%H%M%S'), os.getpid(), pool.hits + pool.misses)
+		self.keyboard = self.session.keyboard
+		self.context = contextvars.copy_context()
+		self.context.run(session.set, self.session)
+		self.sized = asyncio.get_running_loop().create_future()
+		transport.write(bytes([IAC, DO, NAWS, IAC, WILL, ECHO, IAC, WILL, SGA]))
+		self.task = asyncio.get_running_loop().create_task(self.run(), context=self.context)
+
+	def data_received(self, data):
+		self.context.run(self.received, data)
+
+	def received(self, data):
+		text = self.telnet(self.pending + data)
+		if text and out.recorder:
+			out.recorder.input(text)
+		if text:
+			self.keyboard.feed(self.keyboard.decoder.decode(text))
+
+	def connection_lost(self, exc):
+		self.keyboard.close()
+
+	def telnet(self, data):
+		text = bytearray()
+		i = 0
+		if self.discard:
+			i = data.find(bytes([IAC, SE]))
+			if i < 0:
+				self.pending = data[-1:] if data[-1:] == bytes([IAC]) else b''
+				return b''
+			self.discard = False
+			i += 2
+		while i < len(data):
+			if data[i] != IAC:
+				j = data.find(IAC, i)
+				j = len(data) if j < 0 else j
+				text += data[i:j]
+				i = j
+			elif i + 1 >= len(data):
+				break
+			elif data[i + 1] == IAC:
+				text.append(IAC)
+				i += 2
+			elif data[i + 1] in [WILL, WONT, DO, DONT]:
+				if i + 2 >= len(data):
+					break
+				i += 3
+			elif data[i + 1] == SB:
+				j = data.find(bytes([IAC, SE]), i)
+				if j < 0:
+					if len(data) - i > SUBNEG_MAX:
+						self.discard = True
+						i = len(data) - 1 if data[-1] == IAC else len(data)
+					break
+				payload = data[i + 2:j].replace(bytes([IAC, IAC]), bytes([IAC]))
+				if payload[:1] == bytes([NAWS]) and len(payload) >= 5:
+					self.resize(payload[1] << 8 | payload[2], payload[3] << 8 | payload[4])
+				i = j + 2
+			else:
+				i += 2
+		self.pending = data[i:]
+		return bytes(text)
+
+	def resize(self, cols, rows):
+		if cols < MIN_COLS or rows < MIN_ROWS:
+			return
+		if not self.sized.done():
+			self.sized.set_result(None)
+		resize(cols, rows)
+
+	async def negotiate(self):
+		try:
+			await asyncio.wait_for(asyncio.shield(self.sized), NEGOTIATE_TIMEOUT)
+			return
+		except asyncio.TimeoutError:
+			pass
+		self.keyboard.position = asyncio.get_running_loop().create_future()
+		self.transport.write(b'\x1b7\x1b[999;999H\x1b[6n\x1b8')
+		try:
+			rows, cols = await asyncio.wait_for(asyncio.shield(self.keyboard.position), NEGOTIATE_TIMEOUT)
+			self.resize(cols, rows)
+		except (asyncio.TimeoutError, EOFError):
+			pass
+
+	async def run(self):
+		try:
+			await self.negotiate()
+			writer = self.session.out
+			name = self.session.name
+			if record_dir:
+				writer.recorder = Recorder(os.path.join(record_dir, name + '.crec'), writer, self.session.reseed())
+			if spectate_dir:
+				writer.broadcast = Broadcast(writer, os.path.join(spectate_dir, name + '.sock'))
+				await writer.broadcast.start()
+			await play()
+		finally:
+			flush()
+			if out.recorder:
+				out.recorder.close()
+			if out.broadcast:
+				out.broadcast.close()
+			if journal:
+				journal.close()
+			self.transport.close()
+
+class SessionPool:
+	def __init__(self, size=POOL_SIZE, refill=POOL_REFILL):
+		self.size = size
+		self.refill = refill
+		self.ready = collections.deque()
+		self.hits = 0
+		self.misses = 0
+		self.take_ns = 0
+
+	def build(self):
+		built = Session(None, SocketInput(None), SocketWriter(None), Clock())
+		built.world = GameState(rng=built.rng)
+		return built
+
+	def fill(self, n=None):
+		for _ in range(min(self.size - len(self.ready), self.size if n is None else n)):
+			self.ready.append(self.build())
+
+	def reroll(self):
+		for ready in self.ready:
+			ready.reseed()
+
+	def take(self, transport):
+		start = time.perf_counter_ns()
+		if self.ready:
+			taken = self.ready.popleft()
+			self.hits += 1
+		else:
+			taken = self.build()
+			self.misses += 1
+		taken.keyboard.transport = transport
+		taken.out.transport = transport
+		self.take_ns += time.perf_counter_ns() - start
+		return taken
+
+	async def refiller(self):
+		credit = 0
+		while self.refill > 0:
+			credit = min(credit + self.refill * POOL_TICK, self.size)
+			self.fill(int(credit))
+			credit -= int(credit)
+			await asyncio.sleep(POOL_TICK)
+
+	def stats(self):
+		taken = self.hits + self.misses
+		return {
+			'pid': os.getpid(),
+			'size': self.size,
+			'ready': len(self.ready),
+			'hits': self.hits,
+			'misses': self.misses,
+			'hit_rate': round(self.hits / taken, 4) if taken else None,
+			'take_us': round(self.take_ns / taken / 1000, 2) if taken else None
+		}
+
+	def report(self):
+		print(json.dumps(self.stats()), file=sys.stderr, flush=True)
+
+async def serve(port=SERVER_PORT, host=SERVER_HOST, sock=None):
+	global save_dir, pool
+	save_dir = save_dir or os.path.abspath(SAVE_DIR)
+	os.makedirs(save_dir, exist_ok=True)
+	pool = pool or SessionPool()
+	pool.fill()
+	loop = asyncio.get_running_loop()
+	loop.add_signal_handler(signal.SIGUSR1, pool.report)
+	refiller = loop.create_task(pool.refiller())
+	server = await (loop.create_server(TelnetSession, sock=sock) if sock else loop.create_server(TelnetSession, host, port))
+	try:
+		async with server:
+			await server.serve_forever()
+	finally:
+		refiller.cancel()
+
+def serve_forked(port=SERVER_PORT, host=SERVER_HOST, workers=1):
+	sock = socket.create_server((host, port), backlog=1024)
+	pool.fill()
+	children = []
+	for n in range(workers):
+		pid = os.fork()
+		if pid == 0:
+			random.seed()
+			pool.reroll()
+			try:
+				asyncio.run(serve(sock=sock))
+			finally:
+				os._exit(0)
+		children.append(pid)
+	sock.close()
+	forward = lambda signum, frame: [os.kill(pid, signum) for pid in children]
+	for signum in [signal.SIGUSR1, signal.SIGTERM, signal.SIGINT]:
+		signal.signal(signum, forward)
+	for pid in children:
+		os.waitpid(pid, 0)
+
+def refill_rate(value):
+	rate = float(value)
+	if rate < 0:
+		raise argparse.ArgumentTypeError('refill rate must be 0 or more, got {0}'.format(value))
+	return rate
+
+def log_pages(value):
+	pages = int(value)
+	if pages < 0:
+		raise argparse.ArgumentTypeError('log page cap must be 0 or more, got {0}'.format(value))
+	return pages
+
+def server_parser():
+	parser = argparse.ArgumentParser(prog='python3 game.py --serve', description='Host telnet/TCP game sessions on localhost')
+	parser.add_argument('port', nargs='?', type=int, default=SERVER_PORT)
+	parser.add_argument('--pool', type=int, default=POOL_SIZE, help='ready sessions kept per process')
+	parser.add_argument('--refill', type=refill_rate, default=POOL_REFILL, help='sessions built per second to top the pool back up, 0 to never refill')
+	parser.add_argument('--fork', type=int, default=0, help='fork this many workers from a warmed parent')
+	parser.add_argument('--log-pages', type=log_pages, default=LOG_MAX_PAGES, help='log entries kept per session, 0 keeps them all')
+	parser.add_argument('--saves', metavar='DIR', default=SAVE_DIR, help='directory player saves are written to, one folder per session')
+	parser.add_argument('--record', metavar='DIR', default=None, help='record every session into this directory')
+	parser.add_argument('--spectate', metavar='DIR', default=None, help='open a viewer socket for every session in this directory')
+	return parser
+
+def server_main(argv):
+	global pool, save_dir, record_dir, spectate_dir, LOG_MAX_PAGES
+	args = server_parser().parse_args(argv)
+	pool = SessionPool(args.pool, args.refill)
+	save_dir = os.path.abspath(args.saves)
+	LOG_MAX_PAGES = args.log_pages
+	record_dir = args.record and os.path.abspath(args.record)
+	spectate_dir = args.spectate and os.path.abspath(args.spectate)
+	if args.fork:
+		serve_forked(args.port, workers=args.fork)
 	else:
-		title_screen()
-		start_cutscene()
-		game_start()
+		asyncio.run(serve(args.port))
+
+save_dir = None
+pool = None
+record_dir = None
+spectate_dir = None
+
+## MARK: Main ##
+USAGE = [
+	'usage: python3 game.py [--record FILE] [--spectate PATH] [savefile | --ship <rows>x<cols>[:seed]]',
+	'usage: python3 game.py --watch PATH'
+]
 
-init()
+def usage():
+	lines = USAGE[:1] + [parser.format_usage() for parser in [server_parser(), replay_parser()]] + USAGE[1:]
+	return '\n'.join(' '.join(line.split()) for line in lines)
+
+async def main():
+	asyncio.get_running_loop().add_signal_handler(signal.SIGWINCH, resize)
+	use(timer=Clock(paced=os.isatty(out.fd)))
+	if out.broadcast:
+		await out.broadcast.start()
+	keyboard.start()
+	try:
+		await init()
+	except GameOver:
+		pass
+	finally:
+		keyboard.stop()
+		flush()
+		if out.recorder:
+			out.recorder.close()
+		if out.broadcast:
+			out.broadcast.close()
+
+if __name__ == '__main__':
+	if sys.argv[1:2] == ['--serve']:
+		server_main(sys.argv[2:])
+	elif sys.argv[1:2] == ['--replay']:
+		replay_main(sys.argv[2:])
+	elif sys.argv[1:2] == ['--watch'] and len(sys.argv) == 3:
+		try:
+			asyncio.run(watch(sys.argv[2]))
+		except KeyboardInterrupt:
+			pass
+	else:
+		writer = session.get().out
+		while sys.argv[1:2] in [['--record'], ['--spectate']] and len(sys.argv) > 2:
+			if sys.argv[1] == '--record':
+				writer.recorder = Recorder(sys.argv[2], writer, session.get().reseed())
+			else:
+				writer.broadcast = Broadcast(writer, sys.argv[2])
+			del sys.argv[1:3]
+		asyncio.run(main())
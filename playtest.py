@@ -0,0 +1,184 @@
+import argparse
+import collections
+import os
+import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+import game
+from game import ENG_MAX, ENTER, GameOverState, EnergyPack, OxygenPack
+
+## MARK: Constants ##
+KEY_TOPICS = ['continue', 'hull', 'log']
+STATES = [state.name for state in GameOverState] + ['stalled']
+
+## MARK: Bot input ##
+class Bot:
+	def __init__(self, policy, seed=None, max_turns=500):
+		self.policy = policy
+		self.rng = random.Random(seed)
+		self.max_turns = max_turns
+		self.keys = collections.deque()
+		self.seen = set()
+		self.plan = None
+		self.turns = 0
+		self.answers = collections.Counter()
+
+	def start(self):
+		pass
+
+	def stop(self):
+		pass
+
+	async def get(self, ask=None):
+		if not self.keys:
+			topic, options = ask or ENTER
+			if topic == 'command':
+				self.turns += 1
+				if self.turns > self.max_turns:
+					raise EOFError
+			answer = self.policy(self, topic, options)
+			self.answers[topic, answer] += 1
+			self.keys.extend(answer if topic in KEY_TOPICS else answer + '\n')
+		return self.keys.popleft()
+
+	async def query_pos(self):
+		return [1, 1]
+
+	def record(self, state):
+		return {
+			'state': STATES[-1] if state is None else GameOverState(state).name,
+			'turns': self.turns,
+			'battles': game.world.eng_max - ENG_MAX,
+			'hacks': self.answers['hack', 'a'],
+			'guards': self.answers['hack', 'b'],
+			'sealed': self.answers['hull', '1'],
+			'fled': self.answers['hull', '2'],
+			'used': {item.name: self.answers['use', item.name] for item in [EnergyPack, OxygenPack]},
+			'held': len(game.world.inventory),
+			'eng': game.world.eng,
+			'oxy': game.world.oxy
+		}
+
+## MARK: Navigation ##
+def step(start, goal):
+	path = game.world.ship.path(start, goal, game.blocked_exits())
+	return path[0] if path else None
+
+def nearest(start, kind):
+	for ri in game.world.ship.reachable(start, game.blocked_exits()):
+		if game.world.ship.kind(ri) == kind:
+			return ri
+	return None
+
+## MARK: Policies ##
+def random_play(bot, topic, options):
+	if topic == 'name':
+		return 'Bot'
+	elif topic == 'command':
+		return bot.rng.choice([cmd for cmd in options if cmd not in ['save', 'quit']])
+	elif topic == 'continue':
+		return '\n'
+	return bot.rng.choice(options)
+
+def next_goal(bot):
+	room = game.world.rooms[game.world.p_room]
+	if game.world.eng < game.world.eng_max and any(item.name == EnergyPack.name for item in game.world.inventory):
+		bot.plan = EnergyPack.name
+		return 'use'
+	if game.world.oxy < game.world.oxy_max // 2 and any(item.name == OxygenPack.name for item in game.world.inventory):
+		bot.plan = OxygenPack.name
+		return 'use'
+	for obj in room.objects:
+		if (game.world.p_room, obj) not in bot.seen and obj not in ['door', 'cryopod', 'primary console']:
+			bot.seen.add((game.world.p_room, obj))
+			bot.plan = obj
+			return 'examine'
+	broken = sorted(game.world.fix_rooms)
+	mainframe = game.world.ship.mainframe
+	if broken:
+		goal = broken[0]
+	elif not game.world.rooms[mainframe].fought:
+		goal, bot.plan = mainframe, 'primary console'
+	else:
+		goal, bot.plan = game.world.ship.bridge, 'cryopod'
+	if goal == game.world.p_room:
+		return 'examine'
+	return step(game.world.p_room, goal)
+
+def greedy(bot, topic, options):
+	if len(options) == 1:
+		return options[0]
+	elif topic == 'command':
+		return next_goal(bot)
+	elif topic in ['examine', 'use']:
+		return bot.plan if bot.plan in options else 'nothing'
+	elif topic == 'hack':
+		return 'a'
+	elif topic == 'hull':
+		return '1'
+	elif topic == 'option':
+		return 'b'
+	return random_play(bot, topic, options)
+
+def cautious(bot, topic, options):
+	pod = nearest(game.world.p_room, 6) if topic == 'command' and game.world.eng <= game.world.eng_max // 2 and not game.world.rooms[0].door_locked else None
+	if pod is not None and game.world.rooms[pod].fix_done:
+		bot.plan = 'pod console'
+		return 'examine' if game.world.p_room == pod else step(game.world.p_room, pod)
+	elif topic == 'option' and bot.plan == 'pod console' and game.world.eng <= game.world.eng_max // 2:
+		return 'a'
+	elif topic == 'hack' and game.world.eng <= 2:
+		return bot.rng.choice(options)
+	return greedy(bot, topic, options)
+
+POLICIES = {'random': random_play, 'greedy': greedy, 'cautious': cautious}
+
+## MARK: Simulation ##
+def play(job):
+	policy, seed, max_turns, ship = job
+	bot = Bot(POLICIES[policy], seed, max_turns)
+	return bot.record(game.run_headless(None, seed=seed, reader=bot, ship=ship and game.parse_ship(ship)))
+
+def simulate(policy, games, seed=0, workers=None, max_turns=500, ship=None):
+	workers = workers or os.cpu_count()
+	jobs = [(policy, seed + i, max_turns, ship) for i in range(games)]
+	with ProcessPoolExecutor(workers) as pool:
+		return list(pool.map(play, jobs, chunksize=max(1, games // (workers * 8))))
+
+## MARK: Report ##
+def report(policy, records):
+	states = collections.Counter(r['state'] for r in records)
+	turns = [r['turns'] for r in records]
+	print('[{0}] {1} games'.format(policy, len(records)))
+	print('  outcome: {0}'.format(' '.join('{0}={1:.1f}%'.format(state, 100 * states[state] / len(records)) for state in STATES)))
+	print('  turns: mean={0:.1f} p50={1:.0f} max={2}'.format(statistics.mean(turns), statistics.median(turns), max(turns)))
+	for state in STATES:
+		finished = [r['turns'] for r in records if r['state'] == state]
+		if finished:
+			print('    {0}: mean={1:.1f} p50={2:.0f}'.format(state, statistics.mean(finished), statistics.median(finished)))
+	print('  battles won: {0:.2f} | hack/guard: {1:.1f}/{2:.1f} | hull sealed/fled: {3:.2f}/{4:.2f}'.format(*[statistics.mean(r[key] for r in records) for key in ['battles', 'hacks', 'guards', 'sealed', 'fled']]))
+	print('  use picks: {0} | items held at end: {1:.2f}'.format(' '.join('{0}={1:.2f}'.format(item, statistics.mean(r['used'][item] for r in records)) for item in records[0]['used']), statistics.mean(r['held'] for r in records)))
+	print('  meters at end: eng={0:.2f} oxy={1:.2f}'.format(statistics.mean(r['eng'] for r in records), statistics.mean(r['oxy'] for r in records)))
+
+## MARK: Main ##
+def ship_spec(spec):
+	try:
+		game.parse_ship(spec)
+	except ValueError as e:
+		raise argparse.ArgumentTypeError(str(e))
+	return spec
+
+def main():
+	parser = argparse.ArgumentParser(description='Play whole games with bot policies across a process pool')
+	parser.add_argument('-n', '--games', type=int, default=1000, help='games per policy')
+	parser.add_argument('-p', '--policy', action='append', choices=POLICIES.keys(), help='policy to run (default: all)')
+	parser.add_argument('--seed', type=int, default=0, help='seed of the first game, later games use seed + i')
+	parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: all cores)')
+	parser.add_argument('--max-turns', type=int, default=500, help='commands before a game counts as stalled')
+	parser.add_argument('--ship', type=ship_spec, default=None, help='play on a generated ship, given as <rows>x<cols>[:seed]')
+	args = parser.parse_args()
+	for policy in args.policy or POLICIES:
+		report(policy, simulate(policy, args.games, args.seed, args.workers, args.max_turns, args.ship))
+
+if __name__ == '__main__':
+	main()
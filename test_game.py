@@ -0,0 +1,64 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import game
+
+class CommandTests(unittest.TestCase):
+	def test_quit_needs_full_word(self):
+		self.assertIn('quit', game.COMMANDS)
+		self.assertNotIn('qui', game.COMMANDS)
+		self.assertNotIn('q', game.COMMANDS)
+
+	def test_quit_takes_no_arguments(self):
+		self.assertNotIn('quit now', game.COMMANDS)
+		self.assertNotIn('quit x', game.COMMANDS)
+		self.assertNotIn('QUIT now', game.COMMANDS)
+
+	def test_other_commands_keep_arguments(self):
+		self.assertIn('save slot', game.COMMANDS)
+		self.assertIn('x console', game.COMMANDS)
+		self.assertEqual(game.COMMANDS.parse('examine console'), ('examine', 'console'))
+
+class RecordingTests(unittest.TestCase):
+	async def record(self, path):
+		read_fd, write_fd = os.pipe()
+		reader = game.Keyboard(read_fd)
+		writer = game.FrameWriter(os.open(os.devnull, os.O_WRONLY))
+		writer.screen.row = writer.screen.col = 1
+		game.use(reader=reader, writer=writer, timer=game.Clock())
+		game.resize(80, 24)
+		game.new_game()
+		writer.recorder = game.Recorder(path, writer, game.session.get().reseed())
+		loop = asyncio.get_running_loop()
+		loop.add_reader(read_fd, reader.read)
+		task = asyncio.create_task(game.play())
+		os.write(write_fd, b'\n')
+		for n in range(120):
+			await asyncio.sleep(0.05)
+			os.write(write_fd, b'\n' if n % 6 == 5 else b'\x1b[5;1Rx' if n % 6 == 2 else b'x')
+		for _ in range(600):
+			if reader.waiting and reader.keys.empty():
+				break
+			await asyncio.sleep(0.05)
+		state = game.game_state()
+		task.cancel()
+		loop.remove_reader(read_fd)
+		writer.recorder.close()
+		os.close(read_fd)
+		os.close(write_fd)
+		return state
+
+	def test_keys_rerun_reaches_the_recorded_state(self):
+		path = os.path.join(tempfile.mkdtemp(), 'skip.crec')
+		recorded = asyncio.run(self.record(path))
+		stream = game.Recording(path).input()
+		raw = ''.join(text for at, text in stream['raw'])
+		self.assertIn('\x1b[5;1R', raw)
+		self.assertNotIn('\x1b[5;1R', ''.join(stream['keys']))
+		self.assertGreater(raw.count('x'), ''.join(stream['keys']).count('x'))
+		game.run_headless(stream['keys'], stream['seed'])
+		self.assertEqual(game.game_state(), recorded)
+
+if __name__ == '__main__':
+	unittest.main()